@@ -1,40 +1,120 @@
 # pages/1_Overview.py
-import streamlit as st
 import pandas as pd
+import streamlit as st
+
+from dashboard.cache import content_digest
+from dashboard.datasets import DATA_DIR, DatasetHandle, list_registry, open_dataset
+from dashboard.jobs import job_scheduler
+from dashboard.warmup import warm_dataset
+
+
+def pending(jobs):
+    return any(job.status in ("queued", "running") for job in jobs)
+
+
+def jobs_table(jobs):
+    """Expander with the status of `jobs`."""
+    done = sum(job.status == "done" for job in jobs)
+    with st.expander(f"Background precomputation: {done}/{len(jobs)} done"):
+        st.dataframe(
+            pd.DataFrame({
+                "job": [job.label for job in jobs],
+                "status": [job.status for job in jobs],
+                "seconds": [round(job.elapsed, 1) for job in jobs],
+                "error": [str(job.error or "") for job in jobs],
+            }),
+            hide_index=True,
+        )
+
+
+@st.fragment(run_every=2)
+def poll_jobs(fingerprint):
+    """Refresh the jobs' status every 2 s; rerun the page once they have all finished."""
+    jobs = job_scheduler().jobs(fingerprint)
+    if not pending(jobs):
+        st.rerun()
+    jobs_table(jobs)
+
+
+def show_jobs(fingerprint):
+    """Status of the dataset's background jobs, polled only while some are pending."""
+    jobs = job_scheduler().jobs(fingerprint)
+    if not jobs:
+        return
+    if pending(jobs):
+        poll_jobs(fingerprint)
+    else:
+        jobs_table(jobs)
 
 
 def main():
     st.title("Overview")
     st.write("Upload TSV of adata.obs with cell adata, sample ids, MapMyCell output and UMAP coordinates")
+    st.write("An .h5ad file can be uploaded directly: its obs and obsm UMAP/tSNE embeddings are read, the expression matrix is skipped")
     st.write("Navigate over pages to review different parts of the dataset")
 
-    # --- File upload ---
-    # uploaded_file = st.file_uploader("Upload TSV file", type=["tsv"])
+    # --- Dataset source ---
+    registry = list_registry()
+    source = st.radio(
+        "Dataset source",
+        ["Shared datasets", "Upload"],
+        index=0 if registry else 1,
+        horizontal=True,
+        help=f"Shared datasets are files in `{DATA_DIR}` on the server, loaded once for all users.",
+    )
+
+    handle, uploaded = None, None
+
+    if source == "Shared datasets":
+        if not registry:
+            st.info(f"No datasets found in `{DATA_DIR}`.")
+        else:
+            handle = st.selectbox("Dataset", options=registry, format_func=lambda h: h.name)
+    else:
+        # --- File upload ---
+        uploaded = st.file_uploader("Upload data")
+        if uploaded:
+            # Hash each upload once per session, not on every rerun
+            if st.session_state.get("upload_file_id") != uploaded.file_id:
+                st.session_state["upload_file_id"] = uploaded.file_id
+                st.session_state["upload_digest"] = content_digest(uploaded)
+            handle = DatasetHandle(digest=st.session_state["upload_digest"], name=uploaded.name)
+
+    if handle is None:
+        return
 
+    progress_bar = st.empty()
 
-    # Read data
-    @st.cache_data
-    def load_data(file):
-        try:
-            df = pd.read_csv(file, comment="#", sep="\t", index_col=0)
-            print(df[["outlier", "mt_outlier"]].head().to_string())
-        except Exception as e:
-            st.error(f"Could not read the file as CSV: {e}")
-            st.stop()
+    def show_progress(rows, fraction):
+        progress_bar.progress(fraction, text=f"Parsed {rows:,} rows of {handle.name}…")
 
-        return df
+    try:
+        with st.spinner(f"Loading {handle.name}…"):
+            dataset = open_dataset(handle, uploaded, show_progress)
+    except Exception as e:
+        st.error(f"Could not read the file as .h5ad or CSV: {e}")
+        st.stop()
+    finally:
+        progress_bar.empty()
 
-    # --- File upload ---
-    uploaded = st.file_uploader("Upload data")
+    # Precompute the heavy pages while the user browses; shared across sessions
+    warm_dataset(dataset)
+    show_jobs(dataset.fingerprint)
 
-    if uploaded:
-        st.session_state["data"] = load_data(uploaded)
+    mem_after = dataset.memory / 1e6
+    if dataset.raw_memory is None:
+        st.caption(f"Loaded typed copy from cache: {mem_after:.1f} MB in memory")
+    else:
+        st.caption(
+            f"Compacted dtypes: ~{dataset.raw_memory / 1e6:.1f} MB as a plain parse (estimated) "
+            f"→ {mem_after:.1f} MB in memory"
+        )
 
-        # Show shape / preview
-        with st.expander("Show data preview"):
-            st.write(st.session_state["data"].head())
+    # Show shape / preview
+    with st.expander("Show data preview"):
+        st.write(dataset.head())
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1 @@
+"""Shared data loading, caching and plotting helpers for the dashboard pages."""
@@ -0,0 +1,189 @@
+"""
+Precomputed count cube over sample and taxonomy labels.
+
+Every row is reduced to one integer per axis (its category code), and the
+combinations are counted once with a single ``bincount``/``unique`` pass.
+Only non-empty cells are kept (sparse COO layout: a code array per axis
+plus a count array), so counts, fractions and per-sample bars become sums
+over a few thousand cells instead of group-bys over millions of rows.
+The taxonomy hierarchy behind the cascading selectors is derived from it.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+TAXONOMY_LEVELS = ["supercluster_name", "cluster_name", "subcluster_name"]
+CUBE_AXES = ("sample", *TAXONOMY_LEVELS)
+
+# Bootstrapping probability column of each taxonomy level
+PROBABILITY_COLUMNS = {
+    "supercluster_name": "supercluster_bootstrapping_probability",
+    "cluster_name": "cluster_bootstrapping_probability",
+    "subcluster_name": "subcluster_bootstrapping_probability",
+}
+
+# Above this many possible cells, count via a sort instead of a dense bincount
+_DENSE_LIMIT = 1 << 22
+
+MISSING_LABEL = "NA"
+
+
+class CountCube:
+    def __init__(self, axes, labels, codes, counts):
+        self.axes = list(axes)
+        self.labels = labels    # axis → array of category labels (missing excluded)
+        self.codes = codes      # axis → code per non-empty cell; len(labels) = missing
+        self.counts = counts    # count per non-empty cell
+
+    @classmethod
+    def from_frame(cls, df, axes=CUBE_AXES):
+        labels, row_codes, shape = {}, [], []
+        for axis in axes:
+            cat = pd.Categorical(df[axis]).remove_unused_categories()
+            codes = np.asarray(cat.codes, dtype=np.int64)
+            n = len(cat.categories)
+            codes[codes < 0] = n  # missing gets the slot after the last category
+            labels[axis] = np.asarray(cat.categories)
+            row_codes.append(codes)
+            shape.append(n + 1)
+
+        flat = np.ravel_multi_index(row_codes, shape)
+        size = int(np.prod(shape))
+        if size <= _DENSE_LIMIT:
+            dense = np.bincount(flat, minlength=size)
+            cells = np.flatnonzero(dense)
+            counts = dense[cells]
+        else:
+            cells, counts = np.unique(flat, return_counts=True)
+
+        cell_codes = np.unravel_index(cells, shape)
+        codes = {axis: c.astype(np.int64) for axis, c in zip(axes, cell_codes)}
+        return cls(axes, labels, codes, counts.astype(np.int64))
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def _mask(self, where):
+        mask = np.ones(len(self.counts), dtype=bool)
+        for axis, values in (where or {}).items():
+            wanted = np.flatnonzero(np.isin(self.labels[axis], list(values)))
+            mask &= np.isin(self.codes[axis], wanted)
+        return mask
+
+    def marginal(self, axes, where=None, dropna=True):
+        """Counts per combination of `axes` (a Series), summed over the other axes.
+
+        `where` maps axis → allowed labels and restricts the cells first.
+        With ``dropna=False`` missing labels are kept as "NA". Only non-zero
+        combinations are returned, in category order.
+        """
+        if isinstance(axes, str):
+            axes = [axes]
+        mask = self._mask(where)
+
+        codes = [self.codes[a][mask] for a in axes]
+        counts = self.counts[mask]
+        shape = [len(self.labels[a]) + 1 for a in axes]
+
+        sums = np.bincount(np.ravel_multi_index(codes, shape), weights=counts, minlength=int(np.prod(shape)))
+        sums = sums.reshape(shape).astype(np.int64)
+        if dropna:
+            sums = sums[tuple(slice(0, n - 1) for n in shape)]
+
+        nonzero = np.nonzero(sums)
+        index_arrays = []
+        for axis, idx in zip(axes, nonzero):
+            labels = np.append(self.labels[axis].astype(object), MISSING_LABEL)
+            index_arrays.append(labels[idx])
+
+        if len(axes) == 1:
+            index = pd.Index(index_arrays[0], name=axes[0])
+        else:
+            index = pd.MultiIndex.from_arrays(index_arrays, names=axes)
+        return pd.Series(sums[nonzero], index=index, name="count")
+
+    def options(self, axis, where=None):
+        """Labels of `axis` that have cells under `where`, in category order."""
+        return self.marginal([axis], where=where).index.tolist()
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def count_cube(_df, fingerprint, axes=CUBE_AXES):
+    """CountCube of a dataset over `axes` (a tuple), computed once per process."""
+    return CountCube.from_frame(_df, list(axes))
+
+
+class TaxonomyTree:
+    """The supercluster → cluster → subcluster hierarchy with cell counts per node.
+
+    `children[level][parent]` maps each label of `level` found under
+    `parent` (a label of the level above) to its cell count, so the options
+    of a cascading selector are dictionary lookups instead of column scans.
+    """
+
+    def __init__(self, levels, totals, children):
+        self.levels = list(levels)
+        self.totals = totals      # level → {label: count}, over all parents
+        self.children = children  # level → parent label → {label: count}
+
+    @classmethod
+    def from_cube(cls, cube, levels=TAXONOMY_LEVELS):
+        levels = [level for level in levels if level in cube.axes]
+        totals = {
+            level: {label: int(n) for label, n in sorted(cube.marginal(level).items())}
+            for level in levels
+        }
+        children = {}
+        for parent_level, level in zip(levels, levels[1:]):
+            tree = {}
+            for (parent, label), n in cube.marginal([parent_level, level]).items():
+                tree.setdefault(parent, {})[label] = int(n)
+            children[level] = {parent: dict(sorted(nodes.items())) for parent, nodes in tree.items()}
+        return cls(levels, totals, children)
+
+    def counts(self, level, parent_selection=None):
+        """{label: count} of `level` under the selected parents (all labels if none), sorted by label."""
+        if not parent_selection or level not in self.children:
+            return self.totals[level]
+
+        merged = {}
+        for parent in parent_selection:
+            for label, n in self.children[level].get(parent, {}).items():
+                merged[label] = merged.get(label, 0) + n
+        return dict(sorted(merged.items()))
+
+    def options(self, level, parent_selection=None):
+        """Sorted labels of `level` under the selected parents (all labels if none)."""
+        return list(self.counts(level, parent_selection))
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def taxonomy_tree(_cube, fingerprint):
+    """TaxonomyTree of a dataset, built once per process from its count cube."""
+    return TaxonomyTree.from_cube(_cube)
+
+
+def frequency_table(values, name=None):
+    """Counts per label of one column, most frequent first (ties in category order).
+
+    Counted from the categorical codes with one ``bincount``; missing values
+    are kept as "NA" (after the categories, before the stable sort).
+    """
+    cat = pd.Categorical(values)
+    codes = np.asarray(cat.codes, dtype=np.int64)
+    n = len(cat.categories)
+    codes[codes < 0] = n
+
+    counts = np.bincount(codes, minlength=n + 1)
+    labels = np.append(np.asarray(cat.categories, dtype=object), MISSING_LABEL)
+
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(-counts[present], kind="stable")]
+    return pd.DataFrame({name or "label": labels[order], "count": counts[order]})
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def label_frequencies(_values, fingerprint, column):
+    """`frequency_table` of `column`, computed once per (dataset, column)."""
+    return frequency_table(_values, column)
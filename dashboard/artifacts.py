@@ -0,0 +1,172 @@
+"""
+On-disk cache of derived artifacts (e.g. serialized figures).
+
+Entries are keyed by the dataset digest plus the name and parameters of
+the artifact, so a different dataset or different settings never reuse a
+stale file. Writes are atomic (temp file + rename). When several sessions
+or server processes ask for the same missing artifact, one computes it and
+the others wait for the result (thread lock + ``flock`` on a lock file).
+Locks only exist while an artifact is being computed. The directory is
+size-capped and evicted least-recently-used first.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+from dashboard.diskstore import atomic_write, evict_lru, touch
+
+ARTIFACT_DIR = Path(os.environ.get("DASHBOARD_ARTIFACT_DIR", ".cache/artifacts"))
+ARTIFACT_MAX_BYTES = int(os.environ.get("DASHBOARD_ARTIFACT_MAX_BYTES", 1024 ** 3))
+
+
+class ArtifactCache:
+    suffix = ".bin"
+
+    def __init__(self, directory=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._locks = {}  # key -> (lock, sessions holding or waiting)
+        self._locks_guard = threading.Lock()
+
+    @staticmethod
+    def key(digest, name, params=None):
+        """Stable key for artifact `name` of dataset `digest` built with `params` (JSON-able)."""
+        payload = json.dumps({"digest": digest, "name": name, "params": params or {}}, sort_keys=True)
+        return f"{name}-{hashlib.sha256(payload.encode()).hexdigest()[:32]}"
+
+    def path_for(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """Artifact bytes for `key`, or None."""
+        path = self.path_for(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            # Missing, or the cache directory is unusable: a miss either way
+            return None
+        touch(path)
+        return data
+
+    def put(self, key, data):
+        """Store `data` under `key`. Returns False if it could not be written (e.g. disk full)."""
+        path = self.path_for(key)
+        if not atomic_write(path, lambda tmp: Path(tmp).write_bytes(data)):
+            return False
+        self.evict(keep=path)
+        return True
+
+    def get_or_compute(self, digest, name, params, compute):
+        """Cached bytes of an artifact; `compute()` runs at most once across sessions.
+
+        If the result cannot be stored, the computed bytes are still returned.
+        """
+        key = self.key(digest, name, params)
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        with self._lock(key):
+            # Someone else may have finished it while we waited
+            data = self.get(key)
+            if data is None:
+                data = compute()
+                self.put(key, data)
+        return data
+
+    def evict(self, keep=None):
+        """Delete least-recently-used artifacts until the directory fits `max_bytes`.
+
+        Lock files left behind by a crashed process are removed as well.
+        """
+        evict_lru(self.directory.glob(f"*{self.suffix}"), self.max_bytes, keep)
+        if fcntl is not None:
+            for path in self.directory.glob("locks/*.lock"):
+                _remove_stale_lock(path)
+
+    @contextmanager
+    def _lock(self, key):
+        with self._thread_lock(key):
+            path = self.directory / "locks" / f"{key}.lock"
+            f = _acquire_file_lock(path) if fcntl is not None else None
+            try:
+                yield
+            finally:
+                if f is not None:
+                    # Unlink before unlocking; waiters on this inode then retry
+                    path.unlink(missing_ok=True)
+                    f.close()
+
+    @contextmanager
+    def _thread_lock(self, key):
+        # Reference-counted, so the lock of a key is dropped once nobody holds or waits for it
+        with self._locks_guard:
+            lock, users = self._locks.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self._locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._locks_guard:
+                _, users = self._locks[key]
+                if users == 1:
+                    del self._locks[key]
+                else:
+                    self._locks[key] = (lock, users - 1)
+
+
+def _acquire_file_lock(path):
+    """Open and ``flock`` the lock file at `path`; None if it cannot be created.
+
+    The holder unlinks the file before unlocking, so a waiter that gets the
+    lock on an unlinked inode sees it is stale and tries again.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            f = open(path, "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if _same_file(f, path):
+                    return f
+            except OSError:
+                f.close()
+                raise
+            f.close()
+    except OSError:
+        return None  # e.g. read-only cache directory: in-process locking only
+
+
+def _remove_stale_lock(path):
+    """Delete a lock file nobody holds (left behind by a crashed process)."""
+    try:
+        f = open(path, "a")
+    except OSError:
+        return
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return  # held by a live computation
+        if _same_file(f, path):
+            path.unlink(missing_ok=True)
+
+
+def _same_file(f, path):
+    """True if the open file `f` is still the file at `path`."""
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+artifact_cache = ArtifactCache()
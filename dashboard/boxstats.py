@@ -0,0 +1,132 @@
+"""
+Server-side box-plot statistics.
+
+Quartiles, Tukey whiskers and a capped set of outliers are computed for all
+categories in one vectorized pass over the values sorted by (category,
+value). Only these summaries are sent to Plotly, instead of every cell's
+value.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+MAX_OUTLIERS = 200  # per category
+
+
+def _quantile(sorted_values, starts, counts, q):
+    """Linear-interpolated quantile `q` of every group (same as numpy's default)."""
+    pos = starts + q * (counts - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def grouped_box_stats(codes, values, labels, max_outliers=MAX_OUTLIERS):
+    """Box statistics of `values` per category code.
+
+    Returns ``(stats, outliers)``: `stats` is indexed by label with columns
+    n, q1, median, q3, lowerfence, upperfence; `outliers` is a long frame
+    (label, value) with at most `max_outliers` evenly spaced points per label.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    labels = np.asarray(labels, dtype=object)
+
+    valid = (codes >= 0) & np.isfinite(values)
+    codes, values = codes[valid], values[valid]
+
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+
+    counts_all = np.bincount(codes, minlength=len(labels))
+    starts_all = np.concatenate([[0], np.cumsum(counts_all)[:-1]])
+    present = np.flatnonzero(counts_all)
+    counts, starts = counts_all[present], starts_all[present]
+
+    q1 = _quantile(values, starts, counts, 0.25)
+    median = _quantile(values, starts, counts, 0.5)
+    q3 = _quantile(values, starts, counts, 0.75)
+
+    # Tukey fences; whiskers end at the most extreme points inside them
+    lo_limit = np.full(len(labels), -np.inf)
+    hi_limit = np.full(len(labels), np.inf)
+    lo_limit[present] = q1 - 1.5 * (q3 - q1)
+    hi_limit[present] = q3 + 1.5 * (q3 - q1)
+    below = values < lo_limit[codes]
+    above = values > hi_limit[codes]
+    n_below = np.bincount(codes[below], minlength=len(labels))[present]
+    n_above = np.bincount(codes[above], minlength=len(labels))[present]
+    lowerfence = values[starts + n_below]
+    upperfence = values[starts + counts - 1 - n_above]
+
+    stats = pd.DataFrame(
+        {
+            "n": counts,
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "lowerfence": lowerfence,
+            "upperfence": upperfence,
+        },
+        index=pd.Index(labels[present], name="label"),
+    )
+
+    # Outliers: keep every k-th one per category so each has at most max_outliers
+    out = np.flatnonzero(below | above)
+    out_codes = codes[out]
+    n_out = np.bincount(out_codes, minlength=len(labels))
+    first = np.concatenate([[0], np.cumsum(n_out)[:-1]])
+    rank = np.arange(len(out)) - first[out_codes]
+    stride = np.maximum(1, np.ceil(n_out / max_outliers).astype(np.int64))
+    keep = out[rank % stride[out_codes] == 0]
+
+    outliers = pd.DataFrame({"label": labels[codes[keep]], "value": values[keep]})
+    return stats, outliers
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def box_summary(_df, fingerprint, level, value_col, max_outliers=MAX_OUTLIERS):
+    """Box statistics of `value_col` per label of `level`, once per dataset and level."""
+    cat = pd.Categorical(_df[level])
+    return grouped_box_stats(cat.codes, _df[value_col], cat.categories, max_outliers)
+
+
+def box_figure(stats, outliers, categories=None, title=None, x_label=None, y_label=None, height=600):
+    """Plotly box plot from precomputed statistics, limited to `categories` if given."""
+    if categories is not None:
+        stats = stats[stats.index.isin(categories)]
+        outliers = outliers[outliers["label"].isin(categories)]
+
+    fig = go.Figure()
+    fig.add_trace(
+        go.Box(
+            x=stats.index.tolist(),
+            q1=stats["q1"],
+            median=stats["median"],
+            q3=stats["q3"],
+            lowerfence=stats["lowerfence"],
+            upperfence=stats["upperfence"],
+            boxpoints=False,
+            name="",
+            showlegend=False,
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=outliers["label"],
+            y=outliers["value"],
+            mode="markers",
+            marker=dict(size=4),
+            name="outliers",
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
+        title=title,
+        xaxis_title=x_label,
+        yaxis_title=y_label,
+        height=height,
+        xaxis=dict(categoryorder="array", categoryarray=stats.index.tolist()),
+    )
+    return fig
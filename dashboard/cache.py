@@ -0,0 +1,107 @@
+"""
+On-disk columnar cache of parsed obs tables.
+
+Entries are addressed by a hash of the uploaded bytes and stored as
+uncompressed Arrow IPC (Feather v2) files, so repeated loads of the same
+upload memory-map the typed columns instead of re-parsing the TSV.
+File names also carry CACHE_FORMAT, so entries written by an older parse or
+compaction pipeline are never served (they age out through eviction).
+The directory is capped in size and evicted least-recently-used first.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; without it the cache is disabled
+    pa = None
+    feather = None
+
+from dashboard.diskstore import atomic_write, evict_lru, touch
+
+CACHE_DIR = Path(os.environ.get("DASHBOARD_CACHE_DIR", ".cache/datasets"))
+CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+
+# Bump whenever parsing or compaction changes what an entry holds
+# (1: untyped parse, 2: compacted dtypes)
+CACHE_FORMAT = 2
+
+_READ_CHUNK = 8 * 1024 * 1024
+
+
+def content_digest(file):
+    """Return the sha256 hex digest of a binary file-like object and rewind it."""
+    file.seek(0)
+    h = hashlib.sha256()
+    while True:
+        chunk = file.read(_READ_CHUNK)
+        if not chunk:
+            break
+        h.update(chunk)
+    file.seek(0)
+    return h.hexdigest()
+
+
+class ColumnarCache:
+    """Content-addressed Arrow IPC cache with a size cap and LRU eviction."""
+
+    suffix = ".arrow"
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return pa is not None and self.max_bytes > 0
+
+    def path_for(self, digest):
+        return self.directory / f"{digest}-v{CACHE_FORMAT}{self.suffix}"
+
+    def get_table(self, digest):
+        """Return the memory-mapped Arrow table for `digest`, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        path = self.path_for(digest)
+        try:
+            table = feather.read_table(path, memory_map=True)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+
+        touch(path)
+        return table
+
+    def get(self, digest):
+        """Return the cached DataFrame for `digest`, or None on a miss."""
+        table = self.get_table(digest)
+        if table is None:
+            return None
+        return table.to_pandas(split_blocks=True)
+
+    def put(self, digest, df):
+        """Store `df` under `digest`. Returns False if it could not be cached."""
+        if not self.enabled:
+            return False
+
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. object columns mixing strings and numbers
+            return False
+
+        path = self.path_for(digest)
+        if not atomic_write(path, lambda tmp: feather.write_feather(table, tmp, compression="uncompressed")):
+            return False
+
+        self.evict(keep=path)
+        return True
+
+    def evict(self, keep=None):
+        """Delete least-recently-used entries until the cache fits `max_bytes`."""
+        evict_lru(self.directory.glob(f"*{self.suffix}"), self.max_bytes, keep)
+
+
+columnar_cache = ColumnarCache()
@@ -0,0 +1,110 @@
+"""
+Dtype compaction of the obs table.
+
+The raw TSV parses into object strings and float64 everywhere; most of that
+width is wasted for taxonomy labels, embedding coordinates and probabilities.
+"""
+import pandas as pd
+from pandas.api.types import (
+    is_bool_dtype,
+    is_float_dtype,
+    is_numeric_dtype,
+    is_object_dtype,
+)
+
+# Always stored as category, regardless of cardinality
+CATEGORY_COLUMNS = ["sample", "supercluster_name", "cluster_name", "subcluster_name"]
+
+FLOAT32_COLUMNS = ["umap1", "umap2", "tsna1", "tsna2"]
+FLOAT32_SUFFIXES = ("_bootstrapping_probability",)
+
+BOOL_COLUMNS = ["outlier", "mt_outlier"]
+
+# Other object columns become category when unique values are at most this
+# fraction of the rows (cell barcodes, free text etc. stay as objects)
+MAX_CATEGORY_FRACTION = 0.5
+
+_BOOL_STRINGS = {"true": True, "false": False, "1": True, "0": False}
+
+
+def memory_usage(df):
+    """Deep memory footprint of `df` (index included) in bytes."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def plain_memory_usage(df, sample_rows=100_000):
+    """Estimated footprint of `df` as a plain ``read_csv`` would return it.
+
+    The streaming ingest never materialises that frame: numbers count as
+    64-bit, and each non-numeric column is measured on an evenly spaced
+    sample rebuilt with pandas' default string inference, then scaled up.
+    """
+    total = int(df.index.memory_usage(deep=True))
+    for _, s in df.items():
+        if is_bool_dtype(s):
+            total += int(s.memory_usage(deep=True, index=False))
+        elif is_numeric_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype):
+            total += 8 * len(s)
+        elif len(s):
+            step = max(1, len(s) // sample_rows)
+            sample = pd.Series(s.iloc[::step].to_numpy(dtype=object))
+            total += int(sample.memory_usage(deep=True, index=False) * len(s) / len(sample))
+    return total
+
+
+def _to_bool(s):
+    """Convert a flag column to bool, or nullable boolean if it has missing values."""
+    if is_bool_dtype(s):
+        return s
+
+    if is_numeric_dtype(s):
+        values = s.dropna().unique()
+        if not set(values) <= {0, 1}:
+            return s
+        mapped = s.map({0: False, 1: True})
+    else:
+        mapped = s.map(lambda v: _BOOL_STRINGS.get(str(v).strip().lower()) if pd.notna(v) else None)
+        # Unknown strings → leave the column alone
+        if mapped.isna().sum() != s.isna().sum():
+            return s
+
+    if mapped.isna().any():
+        return mapped.astype("boolean")
+    return mapped.astype(bool)
+
+
+def is_float32_column(col):
+    return col in FLOAT32_COLUMNS or col.endswith(FLOAT32_SUFFIXES)
+
+
+def compact_obs(df, max_category_fraction=MAX_CATEGORY_FRACTION):
+    """Return a copy of `df` with compact dtypes. The input is left unchanged.
+
+    - taxonomy / sample columns and low-cardinality strings → category
+    - embedding coordinates and ``*_bootstrapping_probability`` → float32
+    - ``outlier`` / ``mt_outlier`` → bool
+    """
+    out = df.copy(deep=False)
+    n_rows = len(df)
+
+    for col in df.columns:
+        s = df[col]
+
+        if col in BOOL_COLUMNS:
+            out[col] = _to_bool(s)
+
+        elif is_float32_column(col) and is_numeric_dtype(s) and not is_bool_dtype(s):
+            if not (is_float_dtype(s) and s.dtype.itemsize <= 4):
+                out[col] = s.astype("float32")
+
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            continue
+
+        elif col in CATEGORY_COLUMNS:
+            out[col] = s.astype("category")
+
+        elif is_object_dtype(s) and n_rows:
+            if s.nunique(dropna=True) <= max_category_fraction * n_rows:
+                out[col] = s.astype("category")
+
+    return out
@@ -0,0 +1,316 @@
+"""
+Process-wide dataset store shared by all browser sessions.
+
+Datasets come either from the registry directory on the server or from an
+upload. Each one is parsed once per process and kept in a read-only store
+(``st.cache_resource``); a session only keeps a small `DatasetHandle` in
+``st.session_state["dataset"]`` and pages resolve it with `get_data()`.
+
+When the columnar cache is available the store keeps the memory-mapped
+Arrow table rather than a DataFrame, and pages ask only for the columns
+they use: a column is converted to pandas the first time any page needs it.
+"""
+import collections
+import hashlib
+import itertools
+import json
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from dashboard.cache import columnar_cache
+from dashboard.compaction import compact_obs, memory_usage, plain_memory_usage
+from dashboard.h5ad import is_h5ad, read_h5ad_obs
+from dashboard.ingest import read_obs_tsv
+
+# Copy-on-write: pages get shallow copies of the shared frame, so a page
+# assigning to its copy can never change what other sessions see.
+pd.set_option("mode.copy_on_write", True)
+
+DATA_DIR = Path(os.environ.get("DASHBOARD_DATA_DIR", "data"))
+MAX_DATASETS = int(os.environ.get("DASHBOARD_MAX_DATASETS", 4))
+
+SUPPORTED_SUFFIXES = (".tsv", ".txt", ".tsv.gz", ".txt.gz", ".tsv.zst", ".txt.zst", ".h5ad")
+
+SESSION_KEY = "dataset"
+
+
+class DatasetUnavailable(LookupError):
+    """The handle's dataset is neither in memory, in the cache nor on disk."""
+
+
+# Process-wide load counter, see DatasetFingerprint
+_load_counter = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class DatasetFingerprint:
+    """Cheap, hashable identity of a loaded dataset.
+
+    Pass it to ``st.cache_data`` functions (with the frame itself as an
+    underscored, unhashed argument) so cache keys never hash the data.
+    `version` increases every time a dataset is (re)loaded into the store.
+    """
+    digest: str
+    version: int
+
+
+@dataclass(frozen=True)
+class DatasetHandle:
+    """What a session holds instead of the data itself."""
+    digest: str
+    name: str
+    path: str = None  # None for uploads
+
+
+class Dataset:
+    """A loaded obs table, shared read-only between sessions.
+
+    Backed by either a memory-mapped Arrow `table` (columns materialized
+    lazily and kept for all sessions) or an in-memory `frame`.
+    """
+
+    def __init__(self, handle, frame=None, table=None, raw_memory=None, memory=None):
+        self.handle = handle
+        self.fingerprint = DatasetFingerprint(handle.digest, next(_load_counter))
+        self.raw_memory = raw_memory  # estimated bytes of a plain parse, None if loaded from cache
+        self.memory = memory if memory is not None else (
+            table.nbytes if table is not None else memory_usage(frame)
+        )
+        self._frame = frame
+        self._table = table
+        self._lock = threading.Lock()
+        self._columns = {}
+        self._index = None
+
+        if table is not None:
+            self._meta = table.schema.pandas_metadata or {}
+            index_fields = {c for c in self._meta.get("index_columns", []) if isinstance(c, str)}
+            self.columns = [c for c in table.column_names if c not in index_fields]
+        else:
+            self.columns = list(frame.columns)
+
+    def __len__(self):
+        return self._table.num_rows if self._table is not None else len(self._frame)
+
+    # --- Arrow → pandas, one column at a time ---
+    def _table_to_pandas(self, fields, index_columns):
+        """Convert `fields` of the table, restoring dtypes from the pandas metadata."""
+        meta = dict(self._meta)
+        meta["index_columns"] = index_columns
+        meta["columns"] = [c for c in self._meta.get("columns", []) if c.get("field_name") in fields]
+        table = self._table.select(fields).replace_schema_metadata({b"pandas": json.dumps(meta).encode()})
+        return table.to_pandas(split_blocks=True)
+
+    def _read_index(self):
+        if self._table is None:
+            return self._frame.index
+
+        index_columns = self._meta.get("index_columns", [])
+        if not index_columns:
+            return pd.RangeIndex(self._table.num_rows)
+        first = index_columns[0]
+        if isinstance(first, dict):  # serialized RangeIndex
+            return pd.RangeIndex(first["start"], first["stop"], first["step"], name=first.get("name"))
+        return self._table_to_pandas([first], [first]).index
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._read_index()
+            return self._index
+
+    def _column(self, name):
+        """The table column `name` as a Series, materialized once per process."""
+        index = self.index
+        with self._lock:
+            series = self._columns.get(name)
+            if series is None:
+                values = self._table_to_pandas([name], []).iloc[:, 0].array
+                series = self._columns[name] = pd.Series(values, index=index, name=name, copy=False)
+            return series
+
+    def project(self, columns=None):
+        """DataFrame with only `columns` (all if None); unknown names are skipped.
+
+        A shallow copy under copy-on-write: writing to it copies the
+        affected columns instead of changing the shared data.
+        """
+        if columns is None:
+            columns = self.columns
+        else:
+            columns = [c for c in columns if c in self.columns]
+        if self._table is None:
+            return self._frame[list(columns)]
+        # Built from Series (not arrays) so pandas tracks the references
+        return pd.DataFrame({c: self._column(c) for c in columns}, index=self.index, copy=False)
+
+    @property
+    def dtypes(self):
+        """Column dtypes, without materializing any data."""
+        if self._table is None:
+            return self._frame.dtypes
+        return self.head(0).dtypes
+
+    def head(self, n=5):
+        if self._table is None:
+            return self._frame.head(n)
+        return self._table.slice(0, n).to_pandas()
+
+
+# ---------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------
+def path_digest(path):
+    """Cheap identity of a server-side file: resolved path, size and mtime."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def list_registry(directory=DATA_DIR):
+    """Handles for all supported files in the registry directory, sorted by name."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+
+    handles = []
+    for path in sorted(directory.iterdir()):
+        if path.is_file() and path.name.lower().endswith(SUPPORTED_SUFFIXES):
+            handles.append(DatasetHandle(digest=path_digest(path), name=path.name, path=str(path)))
+    return handles
+
+
+# ---------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------
+def parse_obs(file, progress=None):
+    """Parse a TSV export (plain, gzip or zstd) or an .h5ad into the obs frame the pages expect."""
+    if is_h5ad(file):
+        return read_h5ad_obs(file)
+    return read_obs_tsv(file, progress=progress)
+
+
+def _load(handle, file=None, progress=None):
+    table = columnar_cache.get_table(handle.digest)
+    if table is not None:
+        return Dataset(handle, table=table)
+
+    if file is None:
+        if handle.path is None or not Path(handle.path).is_file():
+            raise DatasetUnavailable(f"Dataset '{handle.name}' is no longer available; upload it again.")
+        with open(handle.path, "rb") as f:
+            df = parse_obs(f, progress)
+    else:
+        df = parse_obs(file, progress)
+
+    raw_memory = plain_memory_usage(df)
+    df = compact_obs(df)
+    memory = memory_usage(df)
+
+    # Serve from the memory-mapped copy so only the columns pages use stay in RAM
+    if columnar_cache.put(handle.digest, df):
+        table = columnar_cache.get_table(handle.digest)
+        if table is not None:
+            return Dataset(handle, table=table, raw_memory=raw_memory, memory=memory)
+    return Dataset(handle, frame=df, raw_memory=raw_memory, memory=memory)
+
+
+# Datasets still referenced anywhere, so each one is parsed once even while
+# it is being (re)inserted into the store; one lock per handle
+_datasets = weakref.WeakValueDictionary()
+_load_locks = collections.defaultdict(threading.Lock)
+_load_locks_guard = threading.Lock()
+
+
+def _get_or_load(handle, file=None, progress=None):
+    with _load_locks_guard:
+        lock = _load_locks[handle]
+    with lock:
+        dataset = _datasets.get(handle)
+        if dataset is None:
+            dataset = _datasets[handle] = _load(handle, file, progress)
+        return dataset
+
+
+@st.cache_resource(max_entries=MAX_DATASETS, show_spinner=False)
+def _shared_dataset(handle, _dataset=None):
+    # Streamlit replays the element calls of a cached function on every hit,
+    # so parsing (and its progress bar) happens outside, in `_get_or_load`;
+    # `_dataset` is excluded from the cache key.
+    return _dataset if _dataset is not None else _get_or_load(handle)
+
+
+def open_dataset(handle, file=None, progress=None):
+    """Load (or fetch from the shared store) and make it this session's dataset.
+
+    `progress(rows, fraction)` is called while a TSV is being parsed. Only
+    the first session that uploads a given content needs to provide the bytes.
+    """
+    dataset = _shared_dataset(handle, _get_or_load(handle, file, progress))
+    st.session_state[SESSION_KEY] = handle
+    return dataset
+
+
+def current_dataset():
+    """The shared Dataset behind this session's handle, or None if nothing is loaded."""
+    handle = st.session_state.get(SESSION_KEY)
+    if handle is None:
+        return None
+    return _shared_dataset(handle)
+
+
+def _resolve():
+    try:
+        return current_dataset()
+    except DatasetUnavailable as e:
+        st.session_state.pop(SESSION_KEY, None)
+        st.error(str(e))
+        return None
+
+
+def get_data(columns=None):
+    """This session's view of the loaded obs frame, or None if nothing is loaded.
+
+    Pass the `columns` a page uses to get a projection with only those
+    (missing ones are skipped). The view shares memory with the shared
+    store; under copy-on-write any modification stays local to the caller.
+    """
+    dataset = _resolve()
+    if dataset is None:
+        return None
+    return dataset.project(columns)
+
+
+def get_fingerprint():
+    """Fingerprint of the loaded dataset, or None if nothing is loaded."""
+    dataset = _resolve()
+    if dataset is None:
+        return None
+    return dataset.fingerprint
+
+
+def embedding_names(dtypes):
+    """Names of the 2-D embeddings among `dtypes`: every numeric `<name>1`/`<name>2` pair.
+
+    UMAP and tSNE come first, then the others alphabetically.
+    """
+    numeric = {c for c, dtype in dtypes.items() if pd.api.types.is_float_dtype(dtype)}
+    names = {c[:-1] for c in numeric if c.endswith("1") and len(c) > 1 and f"{c[:-1]}2" in numeric}
+    first = [n for n in ("umap", "tsna") if n in names]
+    return first + sorted(names - set(first))
+
+
+def get_dtypes():
+    """Dtypes of all columns of the loaded dataset (no data is materialized), or None."""
+    dataset = _resolve()
+    if dataset is None:
+        return None
+    return dataset.dtypes
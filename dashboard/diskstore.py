@@ -0,0 +1,58 @@
+"""
+File helpers shared by the on-disk caches (datasets, artifacts).
+
+Entries are written to a temp file in the same directory and renamed into
+place, so readers never see a half-written file. Recency is tracked
+through mtimes, bumped on every hit (atime is unreliable on hosts mounted
+with ``noatime``), and the oldest entries are removed once a directory
+exceeds its size cap.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+
+def atomic_write(path, write):
+    """Create `path` through `write(tmp_path)` and a rename. Returns False on OSError."""
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+    except OSError:
+        return False
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except OSError:
+        Path(tmp).unlink(missing_ok=True)
+        return False
+    return True
+
+
+def touch(path):
+    """Mark `path` as recently used."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_lru(paths, max_bytes, keep=None):
+    """Delete the least-recently-modified of `paths` until their total size fits `max_bytes`."""
+    entries = []
+    for p in paths:
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if p == keep:
+            continue
+        p.unlink(missing_ok=True)
+        total -= size
@@ -0,0 +1,323 @@
+"""
+Matplotlib figures of the embedding pages.
+
+They live here rather than in the page scripts so that the render pool's
+worker processes and the background warm-up can import them: each function
+takes the cells to draw (no session state) and returns a Figure. Pages
+gather the cells in the script thread and submit e.g.
+``functools.partial(plot_embedding_panel, ...)``.
+
+Images the warm-up precomputes are cached under the keys built here, with
+the DPI set here, so they are exactly the ones the page would render.
+"""
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+from dashboard.plotting import category_codes, category_palette, legend_handles, scatter_categorical
+from dashboard.raster import (
+    aggregate,
+    data_extent,
+    draw_image,
+    over,
+    rasterize_categories,
+    shade_counts,
+    shade_values,
+)
+from dashboard.render import subplots
+
+# Pixel grid of the raster small-multiples tiles
+TILE_SIZE = (300, 300)
+
+# UMAP_color: no legend above this many categories
+MAX_LEGEND_CATEGORIES = 41
+
+UMAP_COLOR_DPI = 200
+UMAP_SAMPLES_DPI = 150
+
+
+# ---------------------------------------------------------------------
+# UMAP colored by a column
+# ---------------------------------------------------------------------
+def color_columns(dtypes):
+    """(categorical, numeric) columns UMAP_color can color by; bools count as categorical."""
+    categorical, numeric = [], []
+    for col, dtype in dtypes.items():
+        if col in ("umap1", "umap2"):
+            continue
+        if is_bool_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype) or dtype == "object":
+            categorical.append(col)
+        elif is_numeric_dtype(dtype):
+            numeric.append(col)
+    return categorical, numeric
+
+
+def umap_color_key(fingerprint, color_col, color_type, renderer, preview, view=None, max_points=None):
+    """figure_cache key of a UMAP_color image."""
+    return (fingerprint, color_col, color_type, renderer, preview, view, max_points)
+
+
+def plot_umap(df, color_col, color_type, renderer, view=None):
+    """Build the UMAP figure for one coloring, optionally limited to `view`
+    (xmin, xmax, ymin, ymax)."""
+    fig, ax = subplots(figsize=(6, 5))
+
+    if color_type == "categorical":
+        if isinstance(df[color_col].dtype, pd.CategoricalDtype):
+            # All categories, so colors don't shift when zoomed in
+            cats = sorted(df[color_col].cat.categories.tolist(), key=lambda x: str(x))
+        else:
+            cats = sorted(
+                df[color_col].dropna().unique().tolist(),
+                key=lambda x: str(x)
+            )
+        palette = category_palette(len(cats))
+        codes = category_codes(df[color_col], cats)
+        x, y = df["umap1"].to_numpy(), df["umap2"].to_numpy()
+
+        if renderer == "raster":
+            # --- same overlay style, binned: grey density + blended category colors ---
+            extent = view or data_extent(x, y)
+            background = shade_counts(aggregate(x, y, extent), color="lightgrey", min_alpha=0.15, max_alpha=0.4)
+            overlay = rasterize_categories(x, y, codes, palette, extent)
+            draw_image(ax, over(overlay, background), extent)
+        else:
+            # --- overlay style: grey background + colored categories ---
+            ax.scatter(
+                x, y,
+                s=1, alpha=0.15, color="lightgrey", label="_background_"
+            )
+
+            # Draw overlay: all categories in one call
+            scatter_categorical(ax, x, y, codes, palette, s=1, alpha=0.8)
+
+        handles = legend_handles(cats, palette)
+
+        # # Missing values shown separately
+        # if df[color_col].isna().any():
+        #     subset_na = df[df[color_col].isna()]
+        #     ax.scatter(
+        #         subset_na["umap1"], subset_na["umap2"],
+        #         s=3, alpha=0.4, marker="x",
+        #         label="(missing)", color="black",
+        #     )
+
+        # ---------- NEW FEATURE: disable legend if too many categories ----------
+        if len(cats) <= MAX_LEGEND_CATEGORIES:
+            if handles:
+                fig.legend(
+                    handles=handles,
+                    title=f"{color_col}",
+                    loc="right",
+                    bbox_to_anchor=(1.18, 0.5),
+                    fontsize="small",
+                )
+            fig.tight_layout(rect=[0, 0, 0.82, 1])
+        else:
+            # No legend → normal tight layout
+            fig.tight_layout()
+
+    else:
+        # numerical → continuous colormap + colorbar
+        values = df[color_col].astype(float)
+        if renderer == "raster":
+            x, y = df["umap1"].to_numpy(), df["umap2"].to_numpy()
+            extent = view or data_extent(x, y)
+            grid = aggregate(x, y, extent, values=values.to_numpy(), how="mean")
+            vmin, vmax = np.nanmin(values), np.nanmax(values)
+            draw_image(ax, shade_values(grid, "viridis", vmin, vmax), extent)
+            sc = ScalarMappable(norm=Normalize(vmin, vmax), cmap="viridis")
+        else:
+            sc = ax.scatter(
+                df["umap1"],
+                df["umap2"],
+                s=1,
+                alpha=0.8,
+                c=values,
+                cmap="viridis",
+            )
+        cbar = fig.colorbar(sc, ax=ax)
+        cbar.set_label(color_col)
+        fig.tight_layout()
+
+    if view is not None:
+        ax.set_xlim(view[0], view[1])
+        ax.set_ylim(view[2], view[3])
+
+    ax.set_xlabel("umap1")
+    ax.set_ylabel("umap2")
+    ax.set_title(f"UMAP colored by {color_col} ({color_type})")
+
+    return fig
+
+
+# ---------------------------------------------------------------------
+# UMAP by sample
+# ---------------------------------------------------------------------
+def umap_samples_key(fingerprint, renderer, seed):
+    """figure_cache key of the UMAP_samples overlay; the seed only matters for scatter."""
+    if renderer == "raster":
+        return (fingerprint, "umap_samples", renderer)
+    return (fingerprint, "umap_samples", renderer, seed)
+
+
+def umap_samples_draw(df, renderer, seed, rasterized=False):
+    """Picklable draw of the UMAP_samples overlay."""
+    if renderer == "raster":
+        return partial(plot_umap_by_sample_raster, df)
+    return partial(plot_umap_by_sample_seaborn, df, seed=seed, rasterized=rasterized)
+
+
+def plot_umap_by_sample_seaborn(
+    df,
+    x_col="umap1",
+    y_col="umap2",
+    sample_col="sample",
+    alpha=0.6,
+    point_size=3,
+    seed=0,
+    palette="tab20",  # Seaborn will cycle automatically even if >20 categories
+    rasterized=False,
+):
+    """
+    Plot all samples on one UMAP figure, layered randomly,
+    using Seaborn for categorical coloring.
+    Draws on its own Figure (no pyplot state), so it is safe on the render pool.
+    `rasterized` embeds the points as an image in vector (SVG/PDF) output.
+    """
+
+    # Shuffle rows to randomize layering
+    df_shuffled = df.sample(frac=1.0, random_state=seed)
+
+    # Build the static figure
+    fig, ax = subplots(figsize=(7, 7))
+
+    # NOTE: Seaborn scatterplot must be drawn on a single axes
+    sns.scatterplot(
+        data=df_shuffled,
+        x=x_col,
+        y=y_col,
+        hue=sample_col,
+        palette=palette,
+        s=point_size,
+        alpha=alpha,
+        edgecolor=None,
+        linewidth=0,
+        rasterized=rasterized,
+        ax=ax,
+    )
+
+    ax.set_title("UMAP by sample (random shuffling) (color = sample)")
+    ax.set_xlabel("UMAP1")
+    ax.set_ylabel("UMAP2")
+
+    # legend removed (41 samples is huge)
+    ax.get_legend().remove()
+
+    fig.tight_layout()
+    return fig
+
+
+def plot_umap_by_sample_raster(
+    df,
+    x_col="umap1",
+    y_col="umap2",
+    sample_col="sample",
+    palette="tab20",
+):
+    """
+    Same view as `plot_umap_by_sample_seaborn`, binned into a pixel grid.
+    Overlapping samples are blended per pixel, so there is no layering order.
+    """
+    samples = pd.Categorical(df[sample_col])
+    colors = category_palette(len(samples.categories), palette)
+
+    extent = data_extent(df[x_col], df[y_col])
+    img = rasterize_categories(df[x_col], df[y_col], samples.codes, colors, extent)
+
+    fig, ax = subplots(figsize=(7, 7))
+    draw_image(ax, img, extent)
+
+    ax.set_title("UMAP by sample (raster, blended) (color = sample)")
+    ax.set_xlabel("UMAP1")
+    ax.set_ylabel("UMAP2")
+
+    fig.tight_layout()
+    return fig
+
+
+# ---------------------------------------------------------------------
+# Embedding panels (UMAP vs tSNE) and small multiples
+# ---------------------------------------------------------------------
+
+
+def plot_embedding_panel(
+    xy, codes, palette, background=None, missing=None, extent=None,
+    title="", labels=("", ""), renderer="scatter", point_size=1, alpha=0.7,
+):
+    """One embedding panel.
+
+    `xy` (n × 2) are the colored cells, with `palette[codes]` as colors (code -1
+    is not drawn); `background` (m × 2) is drawn in grey below them and
+    `missing` (k × 2), cells without a label, as black crosses on top.
+    `extent` (xmin, xmax, ymin, ymax) is the raster's pixel grid.
+    """
+    fig, ax = subplots(figsize=(5, 4))
+
+    if renderer == "raster":
+        img = rasterize_categories(xy[:, 0], xy[:, 1], codes, palette, extent)
+        if background is not None and len(background):
+            img = over(img, shade_counts(aggregate(background[:, 0], background[:, 1], extent), max_alpha=0.4))
+        if missing is not None and len(missing):
+            na = shade_counts(aggregate(missing[:, 0], missing[:, 1], extent), color="black", min_alpha=0.4)
+            img = over(na, img)
+        draw_image(ax, img, extent)
+    else:
+        # Plot "other" cells in grey background
+        if background is not None and len(background):
+            ax.scatter(background[:, 0], background[:, 1], s=1, alpha=0.2, color="lightgrey", label="_nolegend_")
+
+        scatter_categorical(ax, xy[:, 0], xy[:, 1], codes, palette, s=point_size, alpha=alpha)
+
+        # Plot NaN separately if exists
+        if missing is not None and len(missing):
+            ax.scatter(
+                missing[:, 0], missing[:, 1],
+                s=10, alpha=0.4, marker="x", label="_nolegend_", color="black",
+            )
+
+    ax.set_title(title)
+    ax.set_xlabel(labels[0])
+    ax.set_ylabel(labels[1])
+
+    fig.tight_layout()
+    return fig
+
+
+def plot_sample_tile(x, y, background, extent, color, title, renderer="scatter"):
+    """
+    One small-multiples tile: all cells in grey, the cells of one sample (`x`, `y`) in `color`.
+    `background` is a shaded density image (raster) or the (x, y) of a background sample (scatter).
+    """
+    fig, ax = subplots(figsize=(3, 3))
+
+    if renderer == "raster":
+        highlight = shade_counts(aggregate(x, y, extent, size=TILE_SIZE), color=color, min_alpha=0.5)
+        draw_image(ax, over(highlight, background), extent)
+    else:
+        bx, by = background
+        ax.scatter(bx, by, s=0.5, alpha=0.1, color="lightgrey", linewidths=0, rasterized=True)
+        ax.scatter(x, y, s=1, alpha=0.6, color=color, linewidths=0, rasterized=True)
+        ax.set_xlim(extent[0], extent[1])
+        ax.set_ylim(extent[2], extent[3])
+
+    ax.set_title(title, fontsize="small")
+    ax.set_xticks([])
+    ax.set_yticks([])
+    fig.tight_layout()
+    return fig
@@ -0,0 +1,59 @@
+"""
+Plotly figures shared by the pages and the background warm-up.
+
+Pages and warm-up jobs build these through the same functions (and the
+same artifact keys), so a figure precomputed after loading is exactly the
+one the page would have built.
+"""
+import plotly.express as px
+import plotly.io as pio
+
+from dashboard.artifacts import artifact_cache
+
+
+def label_fraction_figure(cube):
+    """Stacked bars of the supercluster fractions per sample."""
+    # Counts per sample × supercluster: a marginal of the count cube
+    counts = (
+        cube.marginal(["sample", "supercluster_name"])
+          .reset_index(name="count")
+          .sort_values(by=["sample", "supercluster_name"], ascending=False)
+    )
+
+    # Compute fractions per sample — transform keeps index aligned
+    counts["fraction"] = (
+        counts["count"] / counts.groupby("sample")["count"].transform("sum")
+    )
+
+    # Plotly Express stacked bar
+    fig = px.bar(
+        counts,
+        x="sample",
+        y="fraction",
+        color="supercluster_name",
+        title="Fraction of Supercluster Labels per Sample",
+        labels={
+            "sample": "Sample",
+            "fraction": "Fraction of Cells",
+        },
+        height=1000,
+        text_auto=True
+    )
+
+    fig.update_layout(
+        barmode="stack",
+        xaxis_title="Sample",
+        yaxis_title="Fraction",
+        yaxis=dict(range=[0, 1])
+    )
+    return fig
+
+
+def label_fraction_json(cube, digest):
+    """`label_fraction_figure` as Plotly JSON, cached on disk per dataset."""
+    return artifact_cache.get_or_compute(
+        digest,
+        "superclusters_per_sample",
+        {"x": "sample", "color": "supercluster_name", "height": 1000},
+        lambda: pio.to_json(label_fraction_figure(cube)).encode(),
+    )
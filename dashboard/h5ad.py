@@ -0,0 +1,138 @@
+"""
+Read the cell metadata of an ``.h5ad`` file without loading AnnData.
+
+Only ``obs`` and the first two components of every ``obsm`` embedding
+(``X_umap``, ``X_tsne``, ``X_pca``, ...) are read, straight from HDF5,
+so ``X`` and the layers are never touched and large files open in seconds.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import h5py
+except ImportError:  # optional dependency, only needed for .h5ad uploads
+    h5py = None
+
+
+HDF5_MAGIC = b"\x89HDF\r\n\x1a\n"
+
+# obsm key → column names the pages expect; other X_* keys become <name>1, <name>2
+EMBEDDING_COLUMNS = {
+    "X_umap": ("umap1", "umap2"),
+    "X_tsne": ("tsna1", "tsna2"),
+}
+
+
+def is_h5ad(file):
+    """True if `file` (a binary file-like with a name) looks like an HDF5/.h5ad file."""
+    name = getattr(file, "name", "") or ""
+    if name.lower().endswith(".h5ad"):
+        return True
+    pos = file.tell()
+    head = file.read(len(HDF5_MAGIC))
+    file.seek(pos)
+    return head == HDF5_MAGIC
+
+
+def embedding_columns(key):
+    """Column names of the first two components of obsm `key` (e.g. X_pca → pca1, pca2)."""
+    if key in EMBEDDING_COLUMNS:
+        return EMBEDDING_COLUMNS[key]
+    name = re.sub(r"\W+", "_", key[2:]).strip("_").lower()
+    return f"{name}1", f"{name}2"
+
+
+def _attr_str(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _read_array(ds):
+    """Read a 1-D dataset, decoding variable-length strings."""
+    if h5py.check_string_dtype(ds.dtype) is not None:
+        return ds.asstr()[...].astype(object)
+    arr = ds[...]
+    if arr.dtype.kind == "S":
+        return arr.astype(str).astype(object)
+    return arr
+
+
+def _read_column(node, legacy_categories=None):
+    """Read one obs column written by any anndata >= 0.7 encoder."""
+    if isinstance(node, h5py.Dataset):
+        values = _read_array(node)
+        # anndata < 0.8 stored categoricals as codes + obs/__categories/<col>
+        name = node.name.rsplit("/", 1)[-1]
+        if legacy_categories is not None and name in legacy_categories:
+            categories = _read_array(legacy_categories[name])
+            return pd.Categorical.from_codes(values.astype(np.int64), categories)
+        return values
+
+    encoding = _attr_str(node.attrs.get("encoding-type", ""))
+    if encoding == "categorical":
+        categories = _read_array(node["categories"])
+        codes = node["codes"][...].astype(np.int64)
+        ordered = bool(node.attrs.get("ordered", False))
+        return pd.Categorical.from_codes(codes, categories, ordered=ordered)
+
+    if encoding in ("nullable-integer", "nullable-boolean"):
+        values = node["values"][...]
+        mask = node["mask"][...].astype(bool)
+        dtype = "Int64" if encoding == "nullable-integer" else "boolean"
+        return _masked(values, mask, dtype)
+
+    raise ValueError(f"Unsupported obs column encoding '{encoding}' for {node.name}")
+
+
+def _masked(values, mask, dtype):
+    arr = pd.array(values, dtype=dtype)
+    arr[mask] = pd.NA
+    return arr
+
+
+def _read_obs(f):
+    obs = f["obs"]
+    if isinstance(obs, h5py.Dataset):
+        raise ValueError("This .h5ad uses the pre-0.7 compound obs layout; re-save it with a recent anndata.")
+
+    index_key = _attr_str(obs.attrs.get("_index", "_index"))
+    index = pd.Index(_read_array(obs[index_key]), name=None if index_key == "_index" else index_key)
+
+    column_order = [_attr_str(c) for c in obs.attrs.get("column-order", [])]
+    legacy_categories = obs.get("__categories")
+
+    data = {col: _read_column(obs[col], legacy_categories) for col in column_order}
+    return pd.DataFrame(data, index=index)
+
+
+def read_h5ad_obs(file):
+    """Return obs of an .h5ad (path or binary file-like) with embedding columns added.
+
+    For each ``X_*`` embedding in ``obsm`` only the first two components are
+    read; embeddings whose column names are already used by obs are skipped.
+    """
+    if h5py is None:
+        raise ImportError("Reading .h5ad files requires the 'h5py' package.")
+
+    with h5py.File(file, "r") as f:
+        df = _read_obs(f)
+
+        obsm = f.get("obsm")
+        if obsm is not None:
+            # Known embeddings first, so their columns win any name clash
+            keys = [k for k in EMBEDDING_COLUMNS if k in obsm]
+            keys += sorted(k for k in obsm if k.startswith("X_") and k not in EMBEDDING_COLUMNS)
+            for key in keys:
+                ds = obsm[key]
+                if not isinstance(ds, h5py.Dataset) or ds.ndim != 2 or ds.shape[1] < 2:
+                    continue
+                col1, col2 = embedding_columns(key)
+                # Skip names obs already uses, and nameless keys ("X_")
+                if col1 in df.columns or col2 in df.columns or col1 == "1":
+                    continue
+                coords = ds[:, :2]
+                df[col1] = coords[:, 0]
+                df[col2] = coords[:, 1]
+
+    return df
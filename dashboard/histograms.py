@@ -0,0 +1,117 @@
+"""
+Server-side histograms of numeric columns.
+
+Each column is sorted once per dataset (finite values, float32). The count
+of any bin is then the difference of two binary searches, so re-binning
+costs O(bins · log n) regardless of the number of cells, and only the bin
+edges and counts are sent to the browser.
+"""
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+
+from dashboard.boxstats import grouped_box_stats
+
+
+class SortedColumn:
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float32)
+        self.values = np.sort(values[np.isfinite(values)])
+        # Box statistics for the marginal box plot, computed once
+        self.box, self.outliers = grouped_box_stats(
+            np.zeros(len(self.values), dtype=np.int64), self.values, ["all"]
+        )
+
+    def __len__(self):
+        return len(self.values)
+
+    def histogram(self, bins):
+        """(edges, counts) of `bins` equal-width bins over [min, max], last bin closed."""
+        if len(self.values) == 0:
+            return np.zeros(bins + 1), np.zeros(bins, dtype=np.int64)
+        lo, hi = float(self.values[0]), float(self.values[-1])
+        if hi <= lo:
+            lo, hi = lo - 0.5, hi + 0.5
+        edges = np.linspace(lo, hi, bins + 1)
+        inner = np.searchsorted(self.values, edges[1:-1], side="left")
+        bounds = np.concatenate([[0], inner, [len(self.values)]])
+        return edges, np.diff(bounds)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def sorted_column(_values, fingerprint, column):
+    """SortedColumn of one numeric column, built once per (dataset, column)."""
+    return SortedColumn(_values)
+
+
+def histogram_figure(column, bins, histnorm=None, marginal_box=True, title=None, x_label=None, y_label=None):
+    """Bar chart of the binned column (percent if `histnorm` == "percent"), with an optional box on top."""
+    edges, counts = column.histogram(bins)
+    y = counts * (100.0 / max(len(column), 1)) if histnorm == "percent" else counts
+
+    bars = go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=y,
+        width=np.diff(edges),
+        customdata=np.stack([edges[:-1], edges[1:]], axis=1),
+        hovertemplate="[%{customdata[0]:.3g}, %{customdata[1]:.3g}): %{y}<extra></extra>",
+        showlegend=False,
+    )
+
+    if not marginal_box:
+        fig = go.Figure(bars)
+    else:
+        box = column.box
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.02)
+        if not box.empty:
+            fig.add_trace(
+                go.Box(
+                    y=[x_label or ""],
+                    q1=box["q1"], median=box["median"], q3=box["q3"],
+                    lowerfence=box["lowerfence"], upperfence=box["upperfence"],
+                    orientation="h", boxpoints=False, showlegend=False, name="",
+                ),
+                row=1, col=1,
+            )
+            fig.add_trace(
+                go.Scatter(
+                    x=column.outliers["value"], y=[x_label or ""] * len(column.outliers),
+                    mode="markers", marker=dict(size=4), showlegend=False, name="outliers",
+                ),
+                row=1, col=1,
+            )
+        fig.update_yaxes(showticklabels=False, row=1, col=1)
+        fig.add_trace(bars, row=2, col=1)
+
+    # Axis titles on the histogram (the bottom row when there is a box)
+    where = dict(row=2, col=1) if marginal_box else {}
+    fig.update_xaxes(title_text=x_label, **where)
+    fig.update_yaxes(title_text=y_label, **where)
+    fig.update_layout(title=title, bargap=0.05)
+    return fig
+
+
+def cumulative_figure(column, bins, title=None, x_label=None):
+    """Cumulative percent of cells up to the end of each bin."""
+    edges, counts = column.histogram(bins)
+    cumulative = np.cumsum(counts) * (100.0 / max(len(column), 1))
+
+    fig = go.Figure(
+        go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=cumulative,
+            width=np.diff(edges),
+            customdata=edges[1:],
+            hovertemplate="≤ %{customdata:.3g}: %{y:.1f}%<extra></extra>",
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
+        title=title,
+        xaxis_title=x_label,
+        yaxis_title="Cumulative percent",
+        bargap=0.05,
+        yaxis=dict(range=[0, 100]),  # lock at 0–100%
+    )
+    return fig
@@ -0,0 +1,234 @@
+"""
+Streaming TSV ingest.
+
+The obs table is decompressed on the fly (gzip or zstd, detected from the
+magic bytes) and parsed in row chunks. Each chunk is appended into typed
+column buffers: float32 for coordinates and probabilities, integer category
+codes for strings. Peak memory therefore stays close to the size of the
+final frame instead of raw text plus an object-dtype frame.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from dashboard.compaction import CATEGORY_COLUMNS, MAX_CATEGORY_FRACTION, is_float32_column
+
+CHUNK_ROWS = 200_000
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Buffers grow by this factor when the row estimate turns out too low
+GROWTH = 1.25
+
+
+def detect_compression(file):
+    """Return the pandas `compression` name for a binary file-like, without consuming it."""
+    pos = file.tell()
+    head = file.read(4)
+    file.seek(pos)
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def _stream_size(file):
+    pos = file.tell()
+    size = file.seek(0, io.SEEK_END)
+    file.seek(pos)
+    return size
+
+
+class _CountingReader(io.RawIOBase):
+    """Pass-through reader that counts the (still compressed) bytes consumed."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.consumed = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._raw.readinto(b)
+        self.consumed += n or 0
+        return n
+
+
+# ---------------------------------------------------------------------
+# Column builders
+# ---------------------------------------------------------------------
+class _NumericBuilder:
+    def __init__(self, dtype, capacity, fixed=False):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.n = 0
+        self.fixed = fixed  # cast incoming chunks instead of promoting the buffer
+
+    def reserve(self, n_more):
+        needed = self.n + n_more
+        if needed > len(self.data):
+            grown = np.empty(max(needed, int(len(self.data) * GROWTH)), dtype=self.data.dtype)
+            grown[: self.n] = self.data[: self.n]
+            self.data = grown
+
+    def append(self, values):
+        if self.fixed:
+            values = values.astype(self.data.dtype, copy=False)
+        else:
+            dtype = np.result_type(self.data.dtype, values.dtype)
+            if dtype != self.data.dtype:
+                self.data = self.data.astype(dtype)
+        self.reserve(len(values))
+        self.data[self.n : self.n + len(values)] = values
+        self.n += len(values)
+
+    def finish(self, name):
+        data = self.data[: self.n]
+        # Drop the unused tail unless it is negligible
+        return data.copy() if len(self.data) > 1.05 * self.n else data
+
+
+class _CategoricalBuilder:
+    def __init__(self, capacity):
+        self.codes = _NumericBuilder(np.int32, capacity, fixed=True)
+        self.lookup = {}
+        self.categories = []
+
+    @classmethod
+    def from_values(cls, values, capacity):
+        builder = cls(capacity)
+        builder.append(values)
+        return builder
+
+    def append(self, values):
+        if values.dtype.kind == "b":
+            # pandas yields Python bools for flag columns with missing values
+            values = values.astype(object)
+        chunk_codes, uniques = pd.factorize(values)
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        mapping[-1] = -1  # factorize marks missing values with -1
+        for i, value in enumerate(uniques):
+            code = self.lookup.get(value)
+            if code is None:
+                code = self.lookup[value] = len(self.categories)
+                self.categories.append(value)
+            mapping[i] = code
+        self.codes.append(mapping[chunk_codes])
+
+    def finish(self, name):
+        codes = self.codes.finish(name)
+        n = len(codes)
+        if name not in CATEGORY_COLUMNS and len(self.categories) > MAX_CATEGORY_FRACTION * n:
+            # Mostly unique strings are cheaper as plain objects
+            values = np.empty(len(self.categories) + 1, dtype=object)
+            values[:-1] = self.categories
+            values[-1] = np.nan
+            return values[codes]
+        return pd.Categorical.from_codes(codes, categories=self.categories)
+
+
+def _fits(builder, values):
+    """Whether a chunk can be appended as parsed, i.e. the same way earlier chunks were read."""
+    if isinstance(builder, _NumericBuilder):
+        return is_numeric_dtype(values.dtype)
+    if values.dtype.kind == "b":
+        return all(isinstance(c, (bool, np.bool_)) for c in builder.categories)
+    return not is_numeric_dtype(values.dtype)
+
+
+def _new_builder(name, values, capacity):
+    if is_numeric_dtype(values.dtype):
+        if is_float32_column(name):
+            return _NumericBuilder(np.float32, capacity, fixed=True)
+        return _NumericBuilder(values.dtype, capacity)
+    return _CategoricalBuilder(capacity)
+
+
+# ---------------------------------------------------------------------
+# Reader
+# ---------------------------------------------------------------------
+def read_obs_tsv(file, progress=None, chunk_rows=CHUNK_ROWS):
+    """Parse a (optionally gzip/zstd-compressed) obs TSV from a binary file-like.
+
+    `progress(rows, fraction)` is called after every chunk, with the rows
+    parsed so far and the fraction of input bytes consumed.
+
+    A column mixing numbers and text is read as text, as a whole-file parse
+    would: once a chunk disagrees with the earlier ones, the file is read
+    again with that column as strings, so labels keep their exact spelling.
+    """
+    start = file.tell()
+    text_columns = set()
+    while True:
+        df, mixed = _read_chunks(file, progress, chunk_rows, text_columns)
+        if not mixed:
+            return df
+        text_columns |= mixed
+        file.seek(start)
+
+
+def _read_chunks(file, progress, chunk_rows, text_columns):
+    """(frame, None), or (None, columns) if `columns` turned out mixed."""
+    compression = detect_compression(file)
+    total_bytes = _stream_size(file) - file.tell()
+    counter = _CountingReader(file)
+    reader = io.BufferedReader(counter, buffer_size=1024 * 1024)
+
+    chunks = pd.read_csv(
+        reader,
+        comment="#",
+        sep="\t",
+        index_col=0,
+        compression=compression,
+        chunksize=chunk_rows,
+        dtype=dict.fromkeys(text_columns, str) or None,
+    )
+
+    builders = {}
+    index_parts = []
+    index_name = None
+    columns = None
+    n_rows = 0
+
+    with chunks:
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+                index_name = chunk.index.name
+                # Size the buffers from the bytes the first chunk took
+                fraction = counter.consumed / total_bytes if total_bytes else 1.0
+                capacity = max(len(chunk), int(len(chunk) / max(fraction, 1e-6) * 1.05))
+                builders = {col: _new_builder(col, chunk[col], capacity) for col in columns}
+
+            values = {col: chunk[col].to_numpy() for col in columns}
+            for col, builder in builders.items():
+                if (
+                    isinstance(builder, _NumericBuilder)
+                    and builder.data.dtype.kind == "b"
+                    and not is_numeric_dtype(values[col].dtype)
+                ):
+                    # Missing values showed up in a flag column: same Python bools either way
+                    builders[col] = _CategoricalBuilder.from_values(builder.data[: builder.n], len(builder.data))
+            mixed = {col for col in columns if not _fits(builders[col], values[col])}
+            if mixed:
+                return None, mixed
+
+            for col in columns:
+                builders[col].append(values[col])
+
+            index_parts.append(chunk.index.to_numpy())
+            n_rows += len(chunk)
+
+            if progress is not None:
+                progress(n_rows, min(counter.consumed / total_bytes, 1.0) if total_bytes else 1.0)
+
+    if columns is None:
+        return pd.DataFrame(), None
+
+    data = {col: builders.pop(col).finish(col) for col in columns}
+    index = pd.Index(np.concatenate(index_parts), name=index_name)
+    return pd.DataFrame(data, index=index, copy=False), None
@@ -0,0 +1,126 @@
+"""
+Background job scheduler shared by all sessions.
+
+Jobs run on a small thread pool and are keyed: submitting a key that is
+queued, running or done returns the existing job, so several sessions
+opening the same dataset start each computation only once. Failed jobs
+are retried on the next submit. The finished jobs of a group can be tied
+to an object (e.g. a dataset) and are dropped once it is garbage collected.
+"""
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+JOB_WORKERS = int(os.environ.get("DASHBOARD_JOB_WORKERS", 2))
+
+
+class Job:
+    def __init__(self, key, label, future):
+        self.key = key
+        self.label = label
+        self.future = future
+        self.submitted = time.monotonic()
+        self.finished = None
+
+    def finish(self, future):
+        self.finished = time.monotonic()
+        # A failure's traceback frames would keep the job's inputs (e.g. a dataset) alive
+        if not future.cancelled() and future.exception() is not None:
+            future.exception().__traceback__ = None
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        if self.future.cancelled() or self.future.exception() is not None:
+            return "failed"
+        return "done"
+
+    @property
+    def result(self):
+        """What `fn()` returned, or None unless the job is done."""
+        if self.status == "done":
+            return self.future.result()
+        return None
+
+    @property
+    def error(self):
+        if self.future.done() and not self.future.cancelled():
+            return self.future.exception()
+        return None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.submitted
+
+
+class JobScheduler:
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="dashboard-job")
+        self._jobs = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, label, fn, rerun=False):
+        """Run `fn()` in the background unless a job with `key` is pending or done.
+
+        With ``rerun=True`` a finished job is replaced (e.g. its result was evicted).
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status in ("queued", "running"):
+                return job
+            if job is not None and job.status == "done" and not rerun:
+                return job
+            job = Job(key, label, self._pool.submit(fn))
+            job.future.add_done_callback(job.finish)
+            self._jobs[key] = job
+            return job
+
+    def get(self, key):
+        """The job submitted under `key`, or None."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def jobs(self, group=None):
+        """Jobs in submission order; with `group`, only keys of the form (group, ...)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if group is not None:
+            jobs = [j for j in jobs if j.key[0] == group]
+        return jobs
+
+    def forget(self, group):
+        """Drop finished jobs of `group` (e.g. a dataset that left the store)."""
+        with self._lock:
+            for key, job in list(self._jobs.items()):
+                if key[0] == group and job.future.done():
+                    del self._jobs[key]
+
+    def forget_with(self, group, owner):
+        """`forget(group)` once `owner` has been garbage collected.
+
+        Only the latest owner of a group counts: an object replacing it
+        (e.g. the dataset reloaded after eviction) keeps the jobs.
+        """
+        def release(ref):
+            with self._lock:
+                if self._owners.get(group) is not ref:
+                    return
+                del self._owners[group]
+            self.forget(group)
+
+        with self._lock:
+            ref = self._owners.get(group)
+            if ref is None or ref() is not owner:
+                self._owners[group] = weakref.ref(owner, release)
+
+
+@st.cache_resource(show_spinner=False)
+def job_scheduler():
+    """Process-wide scheduler (``DASHBOARD_JOB_WORKERS`` threads)."""
+    return JobScheduler()
@@ -0,0 +1,66 @@
+"""
+Thread-safe LRU cache of rendered images with a byte budget.
+
+Shared by all sessions (see `figure_cache`); values are encoded image bytes,
+so the budget reflects what is actually held in memory.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+FIGURE_CACHE_MB = int(os.environ.get("DASHBOARD_FIGURE_CACHE_MB", 256))
+
+
+class ByteLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store `value` (bytes) and evict least-recently-used entries over budget.
+
+        Values larger than the whole budget are not stored.
+        """
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            if len(value) > self.max_bytes:
+                return
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get_or_render(self, key, render):
+        """Cached bytes for `key`, calling `render()` to produce them on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value)
+        return value
+
+
+@st.cache_resource(show_spinner=False)
+def figure_cache():
+    """Process-wide cache of rendered figures (``DASHBOARD_FIGURE_CACHE_MB``)."""
+    return ByteLRU(FIGURE_CACHE_MB * 1024 * 1024)
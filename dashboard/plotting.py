@@ -0,0 +1,41 @@
+"""
+Matplotlib helpers shared by the embedding pages.
+
+Categorical scatters are drawn in a single ``ax.scatter`` call: labels are
+mapped to integer codes once and the per-point colors come from one lookup
+into the palette, instead of filtering the frame once per category.
+"""
+import numpy as np
+import pandas as pd
+from matplotlib import colormaps
+from matplotlib.lines import Line2D
+
+
+def category_palette(n, cmap="tab20"):
+    """`n` RGBA colors from a qualitative colormap, cycling when it runs out."""
+    cmap = colormaps[cmap]
+    return [cmap(i % cmap.N) for i in range(n)]
+
+
+def category_codes(values, categories):
+    """Integer code of every value in `categories` order; -1 for missing/other values."""
+    return np.asarray(pd.Categorical(values, categories=categories).codes)
+
+
+def legend_handles(labels, colors, marker="o"):
+    """Proxy artists for a legend of categories drawn without per-category artists."""
+    return [
+        Line2D([], [], marker=marker, linestyle="", color=color, label=str(label))
+        for label, color in zip(labels, colors)
+    ]
+
+
+def scatter_categorical(ax, x, y, codes, colors, **kwargs):
+    """Scatter the points with a non-negative code in one call, colored by `colors[code]`."""
+    codes = np.asarray(codes)
+    keep = codes >= 0
+    point_colors = np.asarray(colors)[codes[keep]]
+    return ax.scatter(
+        np.asarray(x)[keep], np.asarray(y)[keep],
+        c=point_colors, label="_nolegend_", **kwargs,
+    )
@@ -0,0 +1,144 @@
+"""
+Rasterized rendering of large embedding scatters.
+
+Instead of drawing one marker per cell, points are binned into a fixed
+pixel grid with NumPy (``bincount`` over flat pixel indices) and shaded
+into an RGBA image. Cost is one pass over the coordinates plus work
+proportional to the number of pixels, so a few million cells render in
+well under a second and dense regions no longer overdraw.
+
+Images are float RGBA arrays of shape (height, width, 4) with row 0 at the
+bottom; draw them with `draw_image`.
+"""
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.colors import to_rgba
+
+DEFAULT_SIZE = (800, 800)  # width, height in pixels
+
+
+def data_extent(x, y, pad=0.02):
+    """(xmin, xmax, ymin, ymax) of the finite points, padded by a fraction of the range."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x0, x1 = np.nanmin(x), np.nanmax(x)
+    y0, y1 = np.nanmin(y), np.nanmax(y)
+    dx = (x1 - x0) * pad if x1 > x0 else 1.0
+    dy = (y1 - y0) * pad if y1 > y0 else 1.0
+    return (x0 - dx, x1 + dx, y0 - dy, y1 + dy)
+
+
+def pixel_index(x, y, extent, size=DEFAULT_SIZE):
+    """Flat pixel index of every point inside `extent`, and the mask of those points."""
+    width, height = size
+    x0, x1, y0, y1 = extent
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    fx = (x - x0) * (width / (x1 - x0))
+    fy = (y - y0) * (height / (y1 - y0))
+    inside = (fx >= 0) & (fx < width) & (fy >= 0) & (fy < height)  # NaN → False
+
+    ix = fx[inside].astype(np.int64)
+    iy = fy[inside].astype(np.int64)
+    return iy * width + ix, inside
+
+
+def aggregate(x, y, extent, size=DEFAULT_SIZE, values=None, how="count"):
+    """Per-pixel `count` of points, or `mean` of `values` (NaN where empty)."""
+    width, height = size
+    idx, inside = pixel_index(x, y, extent, size)
+    counts = np.bincount(idx, minlength=width * height).astype(np.float64)
+
+    if how == "count":
+        return counts.reshape(height, width)
+
+    if how != "mean":
+        raise ValueError(f"Unknown aggregation '{how}'")
+
+    v = np.asarray(values, dtype=np.float64)[inside]
+    finite = np.isfinite(v)
+    sums = np.bincount(idx[finite], weights=v[finite], minlength=width * height)
+    n = np.bincount(idx[finite], minlength=width * height)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, sums / n, np.nan)
+    return mean.reshape(height, width)
+
+
+def _density_alpha(counts, min_alpha, max_alpha):
+    """Log-scaled opacity for non-empty pixels, 0 for empty ones."""
+    alpha = np.zeros_like(counts, dtype=np.float64)
+    filled = counts > 0
+    if filled.any():
+        scale = np.log1p(counts[filled]) / np.log1p(counts.max())
+        alpha[filled] = min_alpha + (max_alpha - min_alpha) * scale
+    return alpha
+
+
+def shade_counts(counts, color="lightgrey", min_alpha=0.3, max_alpha=1.0):
+    """Single-color density image of a count grid."""
+    img = np.zeros(counts.shape + (4,))
+    img[..., :3] = to_rgba(color)[:3]
+    img[..., 3] = _density_alpha(counts, min_alpha, max_alpha)
+    return img
+
+
+def shade_values(grid, cmap="viridis", vmin=None, vmax=None):
+    """Colormapped image of a per-pixel value grid; NaN pixels are transparent."""
+    finite = np.isfinite(grid)
+    if vmin is None:
+        vmin = np.nanmin(grid) if finite.any() else 0.0
+    if vmax is None:
+        vmax = np.nanmax(grid) if finite.any() else 1.0
+    span = (vmax - vmin) or 1.0
+
+    img = colormaps[cmap](np.clip((np.nan_to_num(grid, nan=vmin) - vmin) / span, 0, 1))
+    img[~finite, 3] = 0.0
+    return img
+
+
+def rasterize_categories(x, y, codes, colors, extent, size=DEFAULT_SIZE, min_alpha=0.5):
+    """Blend category colors per pixel, weighted by how many cells of each fall in it.
+
+    `codes` are integer category codes (negative = skip) and `colors` an
+    (n_categories, 4) RGBA array.
+    """
+    width, height = size
+    codes = np.asarray(codes)
+    colors = np.asarray(colors, dtype=np.float64)
+
+    keep = codes >= 0
+    idx, inside = pixel_index(np.asarray(x)[keep], np.asarray(y)[keep], extent, size)
+    point_colors = colors[codes[keep][inside]]
+
+    counts = np.bincount(idx, minlength=width * height).astype(np.float64)
+    img = np.zeros((width * height, 4))
+    filled = counts > 0
+    for channel in range(3):
+        sums = np.bincount(idx, weights=point_colors[:, channel], minlength=width * height)
+        img[filled, channel] = sums[filled] / counts[filled]
+
+    img = img.reshape(height, width, 4)
+    img[..., 3] = _density_alpha(counts.reshape(height, width), min_alpha, 1.0)
+    return img
+
+
+def over(top, bottom):
+    """Alpha-composite image `top` over `bottom`."""
+    a_top = top[..., 3:4]
+    a_bottom = bottom[..., 3:4]
+    alpha = a_top + a_bottom * (1 - a_top)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rgb = np.where(
+            alpha > 0,
+            (top[..., :3] * a_top + bottom[..., :3] * a_bottom * (1 - a_top)) / alpha,
+            0.0,
+        )
+    return np.concatenate([rgb, alpha], axis=-1)
+
+
+def draw_image(ax, img, extent):
+    """Show a raster image on `ax` in data coordinates."""
+    ax.imshow(img, extent=extent, origin="lower", interpolation="nearest", aspect="auto")
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
@@ -0,0 +1,109 @@
+"""
+Thread-safe Matplotlib rendering without pyplot.
+
+pyplot keeps a process-global registry of open figures and a "current"
+figure, so concurrent sessions can draw into each other's axes and
+figures that are never closed leak. Here every figure is a plain
+``matplotlib.figure.Figure`` with its own Agg canvas, owned by exactly one
+render job. Jobs run on a bounded worker pool (shared by all sessions), and
+the figure is cleared as soon as its bytes are encoded.
+
+Pages fetch their data in the script thread (session state is not
+available in workers) and pass a `draw()` callable that builds the figure
+from it.
+
+Agg draws marker collections while holding the GIL (it calls back into
+Python for every marker), so large scatters do not run in parallel on
+threads. Those are submitted with ``processes=True`` and go to a pool of
+worker processes; `draw` must then be picklable, i.e. a module-level
+function or a ``functools.partial`` of one, with its data as arguments.
+"""
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+CPU_COUNT = os.cpu_count() or 1
+
+RENDER_WORKERS = int(os.environ.get("DASHBOARD_RENDER_WORKERS", min(4, CPU_COUNT)))
+
+# Worker processes for GIL-bound draws; 0 keeps them on the threads (the
+# default on a single core, where processes only add start-up and copy costs)
+RENDER_PROCESSES = int(os.environ.get("DASHBOARD_RENDER_PROCESSES", min(4, CPU_COUNT) if CPU_COUNT > 1 else 0))
+
+
+def new_figure(figsize=None, **kwargs):
+    """A Figure with its own Agg canvas, independent of pyplot."""
+    fig = Figure(figsize=figsize, **kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def subplots(nrows=1, ncols=1, figsize=None, **kwargs):
+    """Like ``plt.subplots``, without pyplot: returns (fig, axes)."""
+    fig = new_figure(figsize)
+    return fig, fig.subplots(nrows, ncols, **kwargs)
+
+
+def to_bytes(fig, format="png", dpi=200, **kwargs):
+    """Encode `fig`; tight bounding box so outside legends are kept."""
+    kwargs.setdefault("bbox_inches", "tight")
+    buf = io.BytesIO()
+    fig.savefig(buf, format=format, dpi=dpi, **kwargs)
+    return buf.getvalue()
+
+
+def dispose(fig):
+    """Drop the figure's artists and data so it can be freed at once."""
+    fig.clear()
+
+
+def _render(draw, format, dpi, save_kwargs):
+    fig = draw()
+    try:
+        return to_bytes(fig, format=format, dpi=dpi, **save_kwargs)
+    finally:
+        dispose(fig)
+
+
+class RenderService:
+    def __init__(self, max_workers=RENDER_WORKERS, max_processes=RENDER_PROCESSES):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="dashboard-render")
+        self._max_processes = max_processes
+        self._processes = self._new_process_pool()
+
+    def _new_process_pool(self):
+        if self._max_processes <= 0:
+            return None
+        # spawn: forking the server would copy its threads' locks in whatever state they are
+        return ProcessPoolExecutor(self._max_processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, draw, format="png", dpi=200, processes=False, **save_kwargs):
+        """Future of the encoded bytes of the figure returned by `draw()`.
+
+        With ``processes=True`` the draw runs in a worker process if any are
+        configured (``DASHBOARD_RENDER_PROCESSES``), otherwise on the threads.
+        """
+        if processes and self._processes is not None:
+            try:
+                return self._processes.submit(_render, draw, format, dpi, save_kwargs)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool
+                self._processes = self._new_process_pool()
+                return self._processes.submit(_render, draw, format, dpi, save_kwargs)
+        return self._pool.submit(_render, draw, format, dpi, save_kwargs)
+
+    def render(self, draw, format="png", dpi=200, processes=False, **save_kwargs):
+        """Encoded bytes of `draw()`'s figure, rendered on the pool."""
+        return self.submit(draw, format, dpi, processes, **save_kwargs).result()
+
+
+@st.cache_resource(show_spinner=False)
+def render_service():
+    """Process-wide render pools (``DASHBOARD_RENDER_WORKERS`` threads, ``DASHBOARD_RENDER_PROCESSES`` processes)."""
+    return RenderService()
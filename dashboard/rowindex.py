@@ -0,0 +1,62 @@
+"""
+Inverted row index per categorical column.
+
+Rows are sorted once by category code, so every category owns one
+contiguous run of (ascending) row positions. Selecting a few categories
+then costs time proportional to the number of selected rows instead of a
+boolean mask over the whole table.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dashboard.spatial import gather_runs
+
+
+class CategoryIndex:
+    def __init__(self, values):
+        cat = pd.Categorical(values)
+        codes = np.asarray(cat.codes, dtype=np.int64)
+        self.labels = cat.categories
+
+        counts = np.bincount(codes + 1, minlength=len(self.labels) + 1)
+        # Stable sort keeps rows ascending within each category; missing (-1) comes first
+        self.rows = np.argsort(codes, kind="stable").astype(np.int32)
+        self.offsets = np.cumsum(counts) - counts  # start of each run, missing first
+        self.counts = counts
+
+    def _runs(self, labels):
+        codes = self.labels.get_indexer(list(labels))
+        codes = np.unique(codes[codes >= 0]) + 1
+        return self.offsets[codes], self.counts[codes]
+
+    def count(self, labels):
+        """Number of rows whose value is in `labels`."""
+        return int(self._runs(labels)[1].sum())
+
+    def positions(self, labels):
+        """Sorted int32 row positions whose value is in `labels`."""
+        starts, lengths = self._runs(labels)
+        if len(starts) == 1:
+            return self.rows[starts[0]:starts[0] + lengths[0]]
+        positions = self.rows[gather_runs(starts, lengths)]
+        positions.sort()
+        return positions
+
+    def missing(self):
+        """Sorted int32 row positions with a missing value."""
+        return self.rows[:self.counts[0]]
+
+
+def restrict(positions, subset):
+    """The `positions` that are also in `subset` (both sorted row positions)."""
+    idx = np.searchsorted(subset, positions)
+    hit = idx < len(subset)
+    hit[hit] = subset[idx[hit]] == positions[hit]
+    return positions[hit]
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def category_index(_values, fingerprint, column):
+    """CategoryIndex of one column, built once per (dataset, column) on first use."""
+    return CategoryIndex(_values)
@@ -0,0 +1,58 @@
+"""
+Stratified downsampling for fast previews.
+
+Uniform subsampling drops rare categories, which are usually the ones of
+interest. Here every category keeps at least `min_per_category` cells (or
+all of them) and the rest of the budget is shared in proportion to size.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dashboard.spatial import gather_runs
+
+PREVIEW_POINTS = 200_000
+MIN_PER_CATEGORY = 500
+
+
+def stratified_sample(codes, max_points=PREVIEW_POINTS, min_per_category=MIN_PER_CATEGORY, seed=0):
+    """Sorted row positions of a stratified random sample of about `max_points` rows.
+
+    `codes` are integer category codes; -1 (missing) is its own stratum.
+    """
+    codes = np.asarray(codes, dtype=np.int64) + 1  # missing → stratum 0
+    n = len(codes)
+    if n <= max_points:
+        return np.arange(n)
+
+    counts = np.bincount(codes)
+    base = np.minimum(counts, min_per_category)
+    rest = counts - base
+
+    alloc = base
+    budget = max_points - base.sum()
+    if budget > 0 and rest.sum() > 0:
+        alloc = base + np.floor(budget * rest / rest.sum()).astype(np.int64)
+
+    # Random order within each stratum, then take a prefix of every run
+    perm = np.random.default_rng(seed).permutation(n)
+    order = perm[np.argsort(codes[perm], kind="stable")]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    rows = order[gather_runs(starts, alloc)]
+    rows.sort()
+    return rows
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def preview_rows(_values, fingerprint, column, max_points=PREVIEW_POINTS, min_per_category=MIN_PER_CATEGORY):
+    """Preview sample stratified by `column`, computed once per (dataset, column).
+
+    Numeric columns are not stratified (a plain random sample).
+    """
+    values = pd.Series(_values)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        codes = np.zeros(len(values), dtype=np.int64)
+    else:
+        codes = pd.Categorical(values).codes
+    return stratified_sample(codes, max_points, min_per_category)
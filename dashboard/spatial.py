@@ -0,0 +1,93 @@
+"""
+Grid index over 2-D embedding coordinates, for zooming and panning.
+
+Points are bucketed into a uniform grid and stored cell by cell, in random
+order within each cell. A viewport query only visits the grid cells it
+overlaps and gathers their contiguous runs of row positions. Taking a
+prefix of each run then gives a density-aware random subsample: sparse
+cells are kept whole and only crowded cells are thinned.
+"""
+import numpy as np
+import streamlit as st
+
+from dashboard.raster import data_extent
+
+
+def gather_runs(starts, lengths):
+    """Concatenate arange(start, start + length) for every run, vectorized."""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    run_offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - run_offsets, lengths) + np.arange(total)
+
+
+class GridIndex:
+    def __init__(self, x, y, n_bins=256, seed=0):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.x, self.y = x, y
+        self.n_bins = n_bins
+        self.extent = data_extent(x, y, pad=0.0)
+
+        rows = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+
+        # Shuffle first, then stable-sort by cell: each cell's run is in random order
+        rows = rows[np.random.default_rng(seed).permutation(len(rows))]
+        ix, iy = self._bin(x[rows], y[rows])
+        cell = iy * n_bins + ix
+        order = np.argsort(cell, kind="stable")
+
+        self.rows = rows[order].astype(np.int64)
+        counts = np.bincount(cell, minlength=n_bins * n_bins)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def _bin(self, x, y):
+        x0, x1, y0, y1 = self.extent
+        n = self.n_bins
+        ix = np.clip(((x - x0) / ((x1 - x0) or 1.0) * n).astype(np.int64), 0, n - 1)
+        iy = np.clip(((y - y0) / ((y1 - y0) or 1.0) * n).astype(np.int64), 0, n - 1)
+        return ix, iy
+
+    def query(self, x0, x1, y0, y1, max_points=None):
+        """Row positions of the points inside the viewport, sorted.
+
+        With `max_points`, at most about that many are returned: every grid
+        cell contributes up to the same cap, so sparse regions survive.
+        """
+        (ix0, ix1), (iy0, iy1) = self._bin(np.array([x0, x1]), np.array([y0, y1]))
+        cx = np.arange(ix0, ix1 + 1)
+        cy = np.arange(iy0, iy1 + 1)
+        cells = (cy[:, None] * self.n_bins + cx[None, :]).ravel()
+
+        starts = self.offsets[cells]
+        lengths = self.offsets[cells + 1] - starts
+
+        if max_points is not None and lengths.sum() > max_points:
+            lengths = np.minimum(lengths, self._per_cell_cap(lengths, max_points))
+
+        rows = self.rows[gather_runs(starts, lengths)]
+
+        # Border cells stick out of the viewport: exact test on the gathered points only
+        xs, ys = self.x[rows], self.y[rows]
+        rows = rows[(xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)]
+        rows.sort()
+        return rows
+
+    @staticmethod
+    def _per_cell_cap(lengths, max_points):
+        """Largest per-cell cap k with sum(min(lengths, k)) <= max_points."""
+        lo, hi = 1, int(lengths.max())
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if np.minimum(lengths, mid).sum() <= max_points:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+
+@st.cache_resource(max_entries=8, show_spinner="Indexing coordinates…")
+def embedding_index(_x, _y, fingerprint, x_col, y_col):
+    """GridIndex over one embedding of a dataset, built once per process."""
+    return GridIndex(_x, _y)
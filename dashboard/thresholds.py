@@ -0,0 +1,109 @@
+"""
+Bootstrapping-threshold sweeps per (sample, label).
+
+For one taxonomy level, every cell's probability is stored in one sorted
+float64 array under the key ``2 * group + probability`` (probabilities are
+in [0, 1], so each group occupies its own interval [2g, 2g + 1]). The
+cells of group g that survive a cutoff t are then everything from
+``searchsorted(keys, 2g + t)`` to the end of the group's run: one binary
+search per (group, threshold), for all groups at once, instead of
+re-filtering millions of rows.
+
+Probabilities are usually stored as float32, so cutoffs are rounded to the
+column's storage dtype before the search: float32(0.7) < 0.7, and a cell
+at exactly 0.7 must still pass a cutoff of 0.7.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dashboard.aggregates import PROBABILITY_COLUMNS
+
+
+class ThresholdSweep:
+    def __init__(self, level, samples, labels, group_sample, group_label, n_cells, starts, ends, keys,
+                 value_dtype=np.float64):
+        self.level = level
+        self.samples = samples            # sample labels
+        self.labels = labels              # taxonomy labels of `level`
+        self.group_sample = group_sample  # sample code per group
+        self.group_label = group_label    # label code per group
+        self.n_cells = n_cells            # cells per group (incl. missing probability)
+        self.starts = starts              # run of each group in `keys`
+        self.ends = ends
+        self.keys = keys
+        self.value_dtype = np.dtype(value_dtype)  # storage dtype of the probabilities
+
+    @classmethod
+    def from_frame(cls, df, level, value_col=None, sample_col="sample"):
+        value_col = value_col or PROBABILITY_COLUMNS[level]
+        sample = pd.Categorical(df[sample_col]).remove_unused_categories()
+        label = pd.Categorical(df[level]).remove_unused_categories()
+        s_codes = np.asarray(sample.codes, dtype=np.int64)
+        l_codes = np.asarray(label.codes, dtype=np.int64)
+
+        # Cells without a sample or label belong to no group
+        valid = (s_codes >= 0) & (l_codes >= 0)
+        flat = s_codes[valid] * len(label.categories) + l_codes[valid]
+        group_ids, group = np.unique(flat, return_inverse=True)
+        n_groups = len(group_ids)
+
+        storage = df[value_col].dtype
+        value_dtype = storage if isinstance(storage, np.dtype) and storage.kind == "f" else np.float64
+        values = np.asarray(df[value_col], dtype=np.float64)[valid]
+        has_value = np.isfinite(values)
+        keys = np.sort(2.0 * group[has_value] + np.clip(values[has_value], 0.0, 1.0))
+
+        n_cells = np.bincount(group, minlength=n_groups)
+        n_values = np.bincount(group[has_value], minlength=n_groups)
+        ends = np.cumsum(n_values)
+        starts = ends - n_values
+
+        return cls(
+            level, np.asarray(sample.categories, dtype=object), np.asarray(label.categories, dtype=object),
+            group_ids // len(label.categories), group_ids % len(label.categories),
+            n_cells, starts, ends, keys, value_dtype,
+        )
+
+    def retained(self, thresholds):
+        """Cells with probability >= t, per group (rows) and threshold (columns).
+
+        A probability equal to the cutoff is retained, also for float32 columns:
+
+        >>> df = pd.DataFrame({
+        ...     "sample": ["a", "a", "a"],
+        ...     "supercluster_name": ["x", "x", "x"],
+        ...     "supercluster_bootstrapping_probability": np.array([0.69, 0.7, 0.9], dtype=np.float32),
+        ... })
+        >>> ThresholdSweep.from_frame(df, "supercluster_name").retained([0.7, 0.9]).tolist()
+        [[2, 1]]
+        """
+        # Compare at the stored precision, then widen (exact) for the 2g + t keys
+        thresholds = np.asarray(thresholds, dtype=np.float64).astype(self.value_dtype).astype(np.float64)
+        # Cutoffs above 1 retain nothing; keep them inside the group's interval
+        thresholds = np.clip(thresholds, 0.0, 1.5)
+        group = np.arange(len(self.n_cells), dtype=np.float64)
+        first = np.searchsorted(self.keys, 2.0 * group[:, None] + thresholds[None, :], side="left")
+        return self.ends[:, None] - first
+
+    def table(self, thresholds):
+        """Long frame: level, sample, label, threshold, cells, retained, fraction."""
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        retained = self.retained(thresholds)
+        n_groups, n_thr = retained.shape
+        n_cells = np.repeat(self.n_cells, n_thr)
+        return pd.DataFrame({
+            "level": self.level,
+            "sample": np.repeat(self.samples[self.group_sample], n_thr),
+            "label": np.repeat(self.labels[self.group_label], n_thr),
+            "threshold": np.tile(thresholds, n_groups),
+            "cells": n_cells,
+            "retained": retained.ravel(),
+            "fraction": retained.ravel() / np.maximum(n_cells, 1),
+        })
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def threshold_sweep(_df, fingerprint, level):
+    """ThresholdSweep of one taxonomy level, built once per (dataset, level)."""
+    return ThresholdSweep.from_frame(_df, level)
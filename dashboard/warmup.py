@@ -0,0 +1,155 @@
+"""
+Precompute the heavy pages' artifacts right after a dataset is loaded.
+
+Each job calls the same cached functions, with the same arguments, as the
+page that needs the result, so it fills the page's cache: opening the page
+afterwards is a cache hit. The default images of the UMAP pages are rendered
+into the shared figure cache under the pages' own keys. Jobs are keyed by (fingerprint, name) in the
+shared scheduler, so loading a dataset in several sessions warms it once.
+"""
+from functools import partial
+
+from dashboard.aggregates import (
+    CUBE_AXES,
+    PROBABILITY_COLUMNS,
+    TAXONOMY_LEVELS,
+    count_cube,
+    label_frequencies,
+    taxonomy_tree,
+)
+from dashboard.boxstats import box_summary
+from dashboard.embedding_figures import (
+    UMAP_COLOR_DPI,
+    UMAP_SAMPLES_DPI,
+    color_columns,
+    plot_umap,
+    umap_color_key,
+    umap_samples_draw,
+    umap_samples_key,
+)
+from dashboard.figures import label_fraction_json
+from dashboard.histograms import sorted_column
+from dashboard.jobs import job_scheduler
+from dashboard.lru import figure_cache
+from dashboard.render import render_service
+from dashboard.sampling import preview_rows
+from dashboard.thresholds import threshold_sweep
+
+# Columns of the label page (Label-Counts-Scores-perSample)
+LABEL_PAGE_COLUMNS = ["sample", *TAXONOMY_LEVELS, *PROBABILITY_COLUMNS.values()]
+
+# Label columns of the MapMyCells page
+MAPMYCELLS_LABEL_COLUMNS = ["supercluster_label", "cluster_label", "subcluster_label"]
+
+
+def _label_page(dataset):
+    df = dataset.project(LABEL_PAGE_COLUMNS)
+    cube = count_cube(df, dataset.fingerprint)
+    taxonomy_tree(cube, dataset.fingerprint)
+    label_fraction_json(cube, dataset.fingerprint.digest)
+
+
+def _box_summary(dataset, level):
+    df = dataset.project(LABEL_PAGE_COLUMNS)
+    box_summary(df, dataset.fingerprint, level, PROBABILITY_COLUMNS[level])
+
+
+def _threshold_sweep(dataset, level):
+    # Same projection as the Bootstrapping-Thresholds page
+    df = dataset.project(LABEL_PAGE_COLUMNS)
+    threshold_sweep(df, dataset.fingerprint, level)
+
+
+def _taxonomy_selectors(dataset):
+    # UMAP vs tSNE page: its own cube over the taxonomy only, and the default preview
+    df = dataset.project(TAXONOMY_LEVELS)
+    taxonomy_tree(count_cube(df, dataset.fingerprint, tuple(TAXONOMY_LEVELS)), dataset.fingerprint)
+    preview_rows(df["supercluster_name"], dataset.fingerprint, "supercluster_name")
+
+
+def _histograms(dataset, columns):
+    df = dataset.project(columns)
+    for column in columns:
+        sorted_column(df[column], dataset.fingerprint, column)
+
+
+def _label_counts(dataset, columns):
+    df = dataset.project(columns)
+    for column in columns:
+        label_frequencies(df[column], dataset.fingerprint, column)
+
+
+def _umap_color_preview(dataset, color_col, color_type):
+    # UMAP_color as first opened: default column, scatter, preview
+    df = dataset.project(["umap1", "umap2", color_col])
+    df = df.iloc[preview_rows(df[color_col], dataset.fingerprint, color_col)]
+    key = umap_color_key(dataset.fingerprint, color_col, color_type, "scatter", True)
+    draw = partial(plot_umap, df, color_col, color_type, "scatter")
+    figure_cache().get_or_render(key, lambda: render_service().render(draw, dpi=UMAP_COLOR_DPI, processes=True))
+
+
+def _umap_samples_overlay(dataset):
+    # UMAP_samples as first opened: scatter overlay, seed 0
+    df = dataset.project(["umap1", "umap2", "sample"])
+    key = umap_samples_key(dataset.fingerprint, "scatter", 0)
+    draw = umap_samples_draw(df, "scatter", 0)
+    figure_cache().get_or_render(key, lambda: render_service().render(draw, dpi=UMAP_SAMPLES_DPI, processes=True))
+
+
+def warmup_tasks(dataset):
+    """(name, label, fn) for every precomputation the dataset's columns allow."""
+    columns = set(dataset.columns)
+    tasks = []
+
+    if columns.issuperset(CUBE_AXES):
+        tasks.append(("label_page", "Label counts and fractions", lambda: _label_page(dataset)))
+    for level, value_col in PROBABILITY_COLUMNS.items():
+        if {level, value_col} <= columns:
+            tasks.append((
+                f"box:{level}", f"Box statistics ({level})",
+                lambda level=level: _box_summary(dataset, level),
+            ))
+        if {"sample", level, value_col} <= columns:
+            tasks.append((
+                f"thresholds:{level}", f"Threshold sweep ({level})",
+                lambda level=level: _threshold_sweep(dataset, level),
+            ))
+    if columns.issuperset(TAXONOMY_LEVELS):
+        tasks.append(("taxonomy", "Taxonomy selectors", lambda: _taxonomy_selectors(dataset)))
+
+    numeric_columns = [c for c in PROBABILITY_COLUMNS.values() if c in columns]
+    if numeric_columns:
+        tasks.append((
+            "histograms", "MapMyCells histograms",
+            lambda: _histograms(dataset, numeric_columns),
+        ))
+
+    label_columns = [c for c in MAPMYCELLS_LABEL_COLUMNS if c in columns]
+    if label_columns:
+        tasks.append((
+            "label_counts", "MapMyCells label counts",
+            lambda: _label_counts(dataset, label_columns),
+        ))
+
+    if {"umap1", "umap2"} <= columns:
+        categorical, numeric = color_columns(dataset.dtypes)
+        if categorical or numeric:
+            color_type = "categorical" if categorical else "numerical"
+            color_col = sorted(categorical or numeric)[0]
+            tasks.append((
+                "umap_color", "UMAP colored by feature (preview image)",
+                lambda: _umap_color_preview(dataset, color_col, color_type),
+            ))
+        if "sample" in columns:
+            tasks.append(("umap_samples", "UMAP by sample (image)", lambda: _umap_samples_overlay(dataset)))
+    return tasks
+
+
+def warm_dataset(dataset):
+    """Schedule the warm-up jobs of `dataset`; returns its jobs."""
+    scheduler = job_scheduler()
+    # Finished jobs are dropped once the dataset has left the shared store
+    scheduler.forget_with(dataset.fingerprint, dataset)
+    for name, label, fn in warmup_tasks(dataset):
+        scheduler.submit((dataset.fingerprint, name), label, fn)
+    return scheduler.jobs(dataset.fingerprint)
@@ -0,0 +1,153 @@
+# Bootstrapping-Thresholds.py
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from dashboard.aggregates import PROBABILITY_COLUMNS, TAXONOMY_LEVELS
+from dashboard.datasets import get_data, get_fingerprint
+from dashboard.thresholds import threshold_sweep
+
+# Columns this page reads from the dataset
+COLUMNS = ["sample", *TAXONOMY_LEVELS, *PROBABILITY_COLUMNS.values()]
+
+
+def parse_thresholds(text):
+    """Sorted unique cutoffs from a comma-separated string; raises ValueError."""
+    values = sorted({float(v) for v in text.replace(";", ",").split(",") if v.strip()})
+    if not values:
+        raise ValueError("Enter at least one threshold.")
+    if values[0] < 0 or values[-1] > 1:
+        raise ValueError("Thresholds must be between 0 and 1.")
+    return values
+
+
+# =======================================
+# ------------ MAIN ---------------------
+# =======================================
+def main():
+    st.set_page_config(page_title="Bootstrapping Thresholds", layout="wide")
+
+    st.title("Bootstrapping Thresholds")
+    st.markdown(
+        """
+        Fraction of cells per sample and label that survive a bootstrapping probability cutoff,
+        at the supercluster, cluster and subcluster level.
+
+        A cell is retained at a level when its bootstrapping probability at that level is at least the threshold.
+        """)
+
+    # --- Load the session's dataset ---
+    df = get_data(columns=COLUMNS)
+    if df is None:
+        st.error("No dataset loaded. Load data on the main page first.")
+        return
+
+    levels = [
+        level for level in TAXONOMY_LEVELS
+        if {"sample", level, PROBABILITY_COLUMNS[level]} <= set(df.columns)
+    ]
+    if not levels:
+        st.error("No sample / taxonomy / bootstrapping probability columns found in data.")
+        return
+
+    text = st.text_input(
+        "Thresholds (comma-separated)",
+        value="0.5, 0.7, 0.9",
+        key="thresholds_values",
+    )
+    try:
+        thresholds = parse_thresholds(text)
+    except ValueError as e:
+        st.error(f"Invalid thresholds: {e}")
+        return
+
+    # Probabilities sorted once per dataset and level; each threshold is a binary search per group
+    with st.spinner("Sorting bootstrapping probabilities…"):
+        tables = {
+            level: threshold_sweep(df, get_fingerprint(), level).table(thresholds)
+            for level in levels
+        }
+
+    # -----------------------------------------------------------------------
+    # Section 1: Retained fraction per sample, all levels
+    # -----------------------------------------------------------------------
+    st.subheader("Retained fraction per sample")
+
+    per_sample = pd.concat(
+        [t.groupby(["level", "sample", "threshold"], observed=True)[["cells", "retained"]].sum().reset_index()
+         for t in tables.values()],
+        ignore_index=True,
+    )
+    per_sample["fraction"] = per_sample["retained"] / per_sample["cells"]
+    per_sample["threshold"] = per_sample["threshold"].map(lambda t: f"≥ {t:g}")
+
+    fig_samples = px.bar(
+        per_sample,
+        x="sample",
+        y="fraction",
+        color="threshold",
+        barmode="group",
+        facet_row="level",
+        category_orders={"level": levels},
+        labels={"sample": "Sample", "fraction": "Fraction retained"},
+        height=300 * len(levels),
+    )
+    fig_samples.update_yaxes(range=[0, 1])
+    st.plotly_chart(fig_samples, width='stretch')
+
+    # -----------------------------------------------------------------------
+    # Section 2: Retained fraction per sample × label at one level
+    # -----------------------------------------------------------------------
+    st.subheader("Retained fraction per sample and label")
+
+    col_level, col_thr, col_top = st.columns(3)
+    level = col_level.selectbox("Taxonomy level", options=levels, key="thresholds_level")
+    threshold = col_thr.selectbox(
+        "Threshold", options=thresholds, format_func=lambda t: f"≥ {t:g}", key="thresholds_threshold"
+    )
+    max_labels = col_top.slider(
+        "Max labels shown (largest first)", min_value=5, max_value=200, value=40, step=5,
+        key="thresholds_max_labels",
+    )
+
+    table = tables[level]
+    table = table[table["threshold"] == threshold]
+
+    # Largest labels first so the heatmap stays readable at the subcluster level
+    label_sizes = table.groupby("label")["cells"].sum().sort_values(ascending=False)
+    shown = label_sizes.index[:max_labels]
+
+    heat = (
+        table[table["label"].isin(shown)]
+        .pivot(index="label", columns="sample", values="fraction")
+        .reindex(shown)
+    )
+    fig_heat = px.imshow(
+        heat,
+        zmin=0,
+        zmax=1,
+        color_continuous_scale="viridis",
+        aspect="auto",
+        labels={"x": "Sample", "y": level, "color": "Fraction retained"},
+        title=f"{level}: fraction of cells with probability ≥ {threshold:g}",
+        height=max(400, 18 * len(shown) + 200),
+    )
+    st.plotly_chart(fig_heat, width='stretch')
+
+    # -----------------------------------------------------------------------
+    # Section 3: Full table
+    # -----------------------------------------------------------------------
+    st.subheader(f"All (sample, {level}) pairs")
+
+    full = tables[level]
+    st.dataframe(full, width='stretch', hide_index=True)
+    st.download_button(
+        label="Download table as TSV",
+        data=full.to_csv(sep="\t", index=False).encode(),
+        file_name=f"bootstrapping_thresholds_{level}.tsv",
+        mime="text/tab-separated-values",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,21 @@
 # Label-Counts-Scores-perSample.py
-from pathlib import Path
-
-import plotly.io
 import streamlit as st
 import plotly.express as px
 import plotly.io as pio
 
-def get_label_fraction_per_sample(df):
-    # Compute counts per sample × supercluster
-    counts = (
-        df.groupby(["sample", "supercluster_name"])
-          .size()
-          .reset_index(name="count")
-          .sort_values(by=["sample", "supercluster_name"], ascending=False)
-    )
-
-    # Compute fractions per sample — transform keeps index aligned
-    counts["fraction"] = (
-        counts["count"] / counts.groupby("sample")["count"].transform("sum")
-    )
-
-    # Plotly Express stacked bar
-    fig = px.bar(
-        counts,
-        x="sample",
-        y="fraction",
-        color="supercluster_name",
-        title="Fraction of Supercluster Labels per Sample",
-        labels={
-            "sample": "Sample",
-            "fraction": "Fraction of Cells",
-        },
-        height=1000,
-        text_auto=True
-    )
+from dashboard.aggregates import count_cube, taxonomy_tree
+from dashboard.boxstats import box_figure, box_summary
+from dashboard.datasets import get_data, get_fingerprint
+from dashboard.figures import label_fraction_json
 
-    fig.update_layout(
-        barmode="stack",
-        xaxis_title="Sample",
-        yaxis_title="Fraction",
-        yaxis=dict(range=[0, 1])
-    )
-    pio.write_json(fig, f"figs/superclusters_per_sample.json")
+# Columns this page reads from the dataset
+COLUMNS = [
+    "sample",
+    "supercluster_name", "cluster_name", "subcluster_name",
+    "supercluster_bootstrapping_probability",
+    "cluster_bootstrapping_probability",
+    "subcluster_bootstrapping_probability",
+]
 
 # =======================================
 # ------------ MAIN ---------------------
@@ -51,7 +25,8 @@ def main():
 
     st.markdown(
         """
-        WARNING: This page takes time to load. Please browse other pages in a mean time :)
+        NOTE: The heavy parts of this page are precomputed in the background once a dataset is loaded
+        (see "Background precomputation" on the main page). Right after loading it may still take a while.
         
         This page is for analysing annotation counts and their confidence scores.
         
@@ -60,28 +35,34 @@ def main():
         """)
 
 
-    # --- Load data from session_state ---
-    df = st.session_state.get("data")
+    # --- Load the session's dataset ---
+    df = get_data(columns=COLUMNS)
     if df is None:
-        st.error("No data found in session_state['data']. Load data on the main page first.")
+        st.error("No dataset loaded. Load data on the main page first.")
         return
 
 
 
     label_options = ["supercluster_name", "cluster_name", "subcluster_name"]
 
+    # Cell counts per sample × supercluster × cluster × subcluster, once per dataset;
+    # every count and fraction below is a slice or marginal of it
+    with st.spinner("Counting cells…"):
+        cube = count_cube(df, get_fingerprint())
+    # Supercluster → cluster → subcluster options for the cascading filters below
+    tree = taxonomy_tree(cube, get_fingerprint())
+
     # -----------------------------------------------------------------------
     # Section 1: Fractions of labels per sample
     # -----------------------------------------------------------------------
     # --- Pre calculating plot of label fractions ---
 
-    file_superclusters_per_sample = Path("figs/superclusters_per_sample.json")
-    if not file_superclusters_per_sample.is_file():
-        file_superclusters_per_sample.parent.mkdir(parents=True, exist_ok=True)
-        with st.spinner("Computing supercluster fractions…"):
-            get_label_fraction_per_sample(df)
+    # Cached on disk per dataset and parameters; computed once even if
+    # several sessions open the page at the same time
+    with st.spinner("Computing supercluster fractions…"):
+        fig_json = label_fraction_json(cube, get_fingerprint().digest)
 
-    fig_fraction = plotly.io.read_json("figs/superclusters_per_sample.json")
+    fig_fraction = pio.from_json(fig_json.decode())
     st.plotly_chart(fig_fraction, width='stretch',)
 
     # -----------------------------------------------------------------------
@@ -96,13 +77,8 @@ def main():
         index=0,
         key="hist_label_level",
     )
-    # Compute counts per sample – this avoids duplicate column names
-    counts_taxo = (
-        df
-        .groupby(col_label_for_hist)
-        .size()
-        .reset_index(name="count")
-    )
+    # Counts per label at the chosen level
+    counts_taxo = cube.marginal([col_label_for_hist]).reset_index(name="count")
 
     # Plot histogram (bar plot) of counts per sample
     fig_counts_taxo = px.bar(
@@ -120,9 +96,7 @@ def main():
 
 
     # 2) Choose category value within that column (selectbox is searchable)
-    categories = sorted(
-        df[col_label_for_hist].dropna().unique().tolist()
-    )
+    categories = sorted(cube.labels[col_label_for_hist].tolist())
 
     if len(categories) == 0:
         st.warning(f"No labels found in column '{col_label_for_hist}'.")
@@ -135,20 +109,14 @@ def main():
         placeholder=f"Type to search {col_label_for_hist}...",
     )
 
-    # Filter data to the selected category
-    df_sel = df[df[col_label_for_hist] == selected_category]
+    # Counts per sample of the selected category
+    counts = cube.marginal(["sample"], where={col_label_for_hist: [selected_category]})
 
-    if df_sel.empty:
+    if counts.empty:
         st.warning(f"No rows found for {col_label_for_hist} = '{selected_category}'.")
         return
 
-    # Compute counts per sample – this avoids duplicate column names
-    counts = (
-        df_sel
-        .groupby("sample")
-        .size()
-        .reset_index(name="count")
-    )
+    counts = counts.reset_index(name="count")
 
     # Plot histogram (bar plot) of counts per sample
     fig_counts = px.bar(
@@ -177,7 +145,7 @@ def main():
             "supercluster_bootstrapping_probability" not in df.columns:
         st.warning("Supercluster column not found in data.")
     else:
-        super_options = sorted(df["supercluster_name"].dropna().unique().tolist())
+        super_options = tree.options("supercluster_name")
         st.markdown(f"Supercluster options: {super_options}")
         selected_super = st.multiselect(
             "Filter supercluster_name (default = all)",
@@ -186,22 +154,21 @@ def main():
             key="super_box_super_filter",
         )
 
-        df_super = df[df["supercluster_name"].isin(selected_super)] if selected_super else df
-
-        df_super_box = df_super[["supercluster_name", "supercluster_bootstrapping_probability"]].dropna()
+        # Box statistics per supercluster, computed once per dataset
+        with st.spinner("Computing box statistics…"):
+            stats, outliers = box_summary(
+                df, get_fingerprint(), "supercluster_name", "supercluster_bootstrapping_probability"
+            )
+        shown = selected_super or super_options
 
-        if df_super_box.empty:
+        if not stats.index.isin(shown).any():
             st.warning("No data available for selected supercluster_name filter.")
         else:
-            fig_super = px.box(
-                df_super_box,
-                x="supercluster_name",
-                y="supercluster_bootstrapping_probability",
+            fig_super = box_figure(
+                stats, outliers, shown,
                 title="Supercluster bootstrapping probability",
-                labels={
-                    "supercluster_name": "Supercluster",
-                    "supercluster_bootstrapping_probability": "Bootstrapping probability",
-                },
+                x_label="Supercluster",
+                y_label="Bootstrapping probability",
                 height=600,
             )
             st.plotly_chart(fig_super, width='stretch')
@@ -216,7 +183,7 @@ def main():
             "cluster_bootstrapping_probability" not in df.columns):
         st.warning("Cluster-related columns not found in data.")
     else:
-        super_options = sorted(df["supercluster_name"].dropna().unique().tolist())
+        super_options = tree.options("supercluster_name")
 
         selected_super_for_cluster = st.multiselect(
             "Filter supercluster_name for clusters (optional)",
@@ -225,12 +192,7 @@ def main():
             key="cluster_super_filter",
         )
 
-        df_for_clusters = (
-            df[df["supercluster_name"].isin(selected_super_for_cluster)]
-            if selected_super_for_cluster else df
-        )
-
-        cluster_options = sorted(df_for_clusters["cluster_name"].dropna().unique().tolist())
+        cluster_options = tree.options("cluster_name", selected_super_for_cluster)
 
         selected_clusters = st.multiselect(
             "Select cluster_name categories (optional)",
@@ -239,25 +201,21 @@ def main():
             key="cluster_name_filter",
         )
 
-        df_cluster = (
-            df_for_clusters[df_for_clusters["cluster_name"].isin(selected_clusters)]
-            if selected_clusters else df_for_clusters
-        )
-
-        df_cluster_box = df_cluster[["cluster_name", "cluster_bootstrapping_probability"]].dropna()
+        # Box statistics per cluster, computed once per dataset
+        with st.spinner("Computing box statistics…"):
+            stats, outliers = box_summary(
+                df, get_fingerprint(), "cluster_name", "cluster_bootstrapping_probability"
+            )
+        shown = selected_clusters or cluster_options
 
-        if df_cluster_box.empty:
+        if not stats.index.isin(shown).any():
             st.warning("No data available for selected cluster_name / supercluster_name filters.")
         else:
-            fig_cluster = px.box(
-                df_cluster_box,
-                x="cluster_name",
-                y="cluster_bootstrapping_probability",
-                title=f"Cluster bootstrapping probability",
-                labels={
-                    "cluster_name": "Cluster",
-                    "cluster_bootstrapping_probability": "Bootstrapping probability",
-                },
+            fig_cluster = box_figure(
+                stats, outliers, shown,
+                title="Cluster bootstrapping probability",
+                x_label="Cluster",
+                y_label="Bootstrapping probability",
                 height=600,
             )
             st.plotly_chart(fig_cluster, width='stretch')
@@ -272,7 +230,7 @@ def main():
             "subcluster_bootstrapping_probability" not in df.columns):
         st.warning("Subcluster-related columns not found in data.")
     else:
-        cluster_options = sorted(df["cluster_name"].dropna().unique().tolist())
+        cluster_options = tree.options("cluster_name")
 
         selected_clusters_for_sub = st.multiselect(
             "Filter cluster_name for subclusters (optional)",
@@ -281,12 +239,7 @@ def main():
             key="subcluster_cluster_filter",
         )
 
-        df_for_sub = (
-            df[df["cluster_name"].isin(selected_clusters_for_sub)]
-            if selected_clusters_for_sub else df
-        )
-
-        subcluster_options = sorted(df_for_sub["subcluster_name"].dropna().unique().tolist())
+        subcluster_options = tree.options("subcluster_name", selected_clusters_for_sub)
 
         selected_subclusters = st.multiselect(
             "Select subcluster_name categories (optional)",
@@ -295,25 +248,21 @@ def main():
             key="subcluster_name_filter",
         )
 
-        df_sub = (
-            df_for_sub[df_for_sub["subcluster_name"].isin(selected_subclusters)]
-            if selected_subclusters else df_for_sub
-        )
-
-        df_sub_box = df_sub[["subcluster_name", "subcluster_bootstrapping_probability"]].dropna()
+        # Box statistics per subcluster, computed once per dataset
+        with st.spinner("Computing box statistics…"):
+            stats, outliers = box_summary(
+                df, get_fingerprint(), "subcluster_name", "subcluster_bootstrapping_probability"
+            )
+        shown = selected_subclusters or subcluster_options
 
-        if df_sub_box.empty:
+        if not stats.index.isin(shown).any():
             st.warning("No data available for selected subcluster_name / cluster_name filters.")
         else:
-            fig_sub = px.box(
-                df_sub_box,
-                x="subcluster_name",
-                y="subcluster_bootstrapping_probability",
+            fig_sub = box_figure(
+                stats, outliers, shown,
                 title="Subcluster bootstrapping probability",
-                labels={
-                    "subcluster_name": "Subcluster",
-                    "subcluster_bootstrapping_probability": "Bootstrapping probability",
-                },
+                x_label="Subcluster",
+                y_label="Bootstrapping probability",
                 height=600,
             )
             st.plotly_chart(fig_sub, width='stretch')
@@ -1,47 +1,51 @@
 # TSNA vs UMAP with hierarchical taxonomy selectors
 
+from functools import partial
+
 import streamlit as st
-import matplotlib.pyplot as plt
 
-# Get dataframe from session state
-df = st.session_state.get("data")
+from dashboard.aggregates import TAXONOMY_LEVELS, count_cube, taxonomy_tree
+from dashboard.datasets import embedding_names, get_data, get_dtypes, get_fingerprint
+from dashboard.embedding_figures import plot_embedding_panel
+from dashboard.lru import figure_cache
+from dashboard.plotting import category_codes, category_palette, legend_handles
+from dashboard.rowindex import category_index, restrict
+from dashboard.raster import data_extent
+from dashboard.render import new_figure, render_service
+from dashboard.sampling import MIN_PER_CATEGORY, PREVIEW_POINTS, preview_rows
+
+# Panel titles of the usual embeddings; others are shown upper-cased
+EMBEDDING_TITLES = {"umap": "UMAP", "tsna": "tSNE"}
 
-st.title("Annotation view: UMAP vs TSNA")
-"""
-This plot shows how our annotations lay on coordinates of UMAP (produced by our processing) and TSNA (produced by authors of the paper)
-"""
 
-# Guard clause
-if df is None:
-    st.error("No dataset found in session_state under key 'data'.")
-    st.stop()
+def embedding_title(name):
+    return EMBEDDING_TITLES.get(name, name.upper())
 
 
 # ---------------------------------------------------------------------
 # Helpers for hierarchical taxonomy selectors
 # ---------------------------------------------------------------------
-def get_level_options(df, level, parent_level=None, parent_selection=None):
+def get_level_options(tree, level, parent_selection=None):
     """
-    Return sorted unique categories for `level` given parent selection.
-    If parent_selection is empty/None or parent_level is None, don't filter by parent.
+    Return {category: cell count} for `level` given parent selection, sorted by category.
+    If parent_selection is empty/None, don't filter by parent.
     """
-    if parent_level is None or not parent_selection:
-        series = df[level]
-    else:
-        mask = df[parent_level].isin(parent_selection)
-        series = df.loc[mask, level]
+    return tree.counts(level, parent_selection)
 
-    return sorted(series.dropna().unique().tolist())
 
+def with_count(counts):
+    """format_func showing each option's number of cells."""
+    return lambda v: f"{v} ({counts.get(v, 0):,})"
 
-def taxonomy_selectors(df, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_saved_"):
+
+def taxonomy_selectors(tree, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_saved_"):
     """Build linked widgets for supercluster → cluster → subcluster
     and persist selections for this page via session_state."""
     # --- SUPERCLUSTER ---
     widget_super = f"{key_prefix}super"
     state_super = f"{state_prefix}super"
 
-    super_options = get_level_options(df, "supercluster_name")
+    super_options = get_level_options(tree, "supercluster_name")
 
     # init saved state once
     if state_super not in st.session_state:
@@ -52,8 +56,9 @@ def taxonomy_selectors(df, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_
 
     selected_super = st.multiselect(
         "Select supercluster_name (optional)",
-        options=super_options,
+        options=list(super_options),
         default=saved_super,
+        format_func=with_count(super_options),
         key=widget_super,
     )
     st.session_state[state_super] = selected_super
@@ -62,12 +67,7 @@ def taxonomy_selectors(df, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_
     widget_cluster = f"{key_prefix}cluster"
     state_cluster = f"{state_prefix}cluster"
 
-    cluster_options = get_level_options(
-        df,
-        "cluster_name",
-        parent_level="supercluster_name",
-        parent_selection=selected_super,
-    )
+    cluster_options = get_level_options(tree, "cluster_name", parent_selection=selected_super)
 
     if state_cluster not in st.session_state:
         st.session_state[state_cluster] = []
@@ -76,8 +76,9 @@ def taxonomy_selectors(df, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_
 
     selected_cluster = st.multiselect(
         "Select cluster_name (optional)",
-        options=cluster_options,
+        options=list(cluster_options),
         default=saved_cluster,
+        format_func=with_count(cluster_options),
         key=widget_cluster,
     )
     st.session_state[state_cluster] = selected_cluster
@@ -86,12 +87,7 @@ def taxonomy_selectors(df, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_
     widget_sub = f"{key_prefix}subcluster"
     state_sub = f"{state_prefix}subcluster"
 
-    subcluster_options = get_level_options(
-        df,
-        "subcluster_name",
-        parent_level="cluster_name",
-        parent_selection=selected_cluster,
-    )
+    subcluster_options = get_level_options(tree, "subcluster_name", parent_selection=selected_cluster)
 
     if state_sub not in st.session_state:
         st.session_state[state_sub] = []
@@ -100,8 +96,9 @@ def taxonomy_selectors(df, key_prefix="tsne_umap_tax_", state_prefix="tsne_umap_
 
     selected_subcluster = st.multiselect(
         "Select subcluster_name (optional)",
-        options=subcluster_options,
+        options=list(subcluster_options),
         default=saved_sub,
+        format_func=with_count(subcluster_options),
         key=widget_sub,
     )
     st.session_state[state_sub] = selected_subcluster
@@ -125,128 +122,209 @@ def get_active_level(selections):
     return None
 
 
-def split_selected_other(df, selections):
+def split_selected_other(df, selections, rows=None):
     """
     Based on lowest non-empty level:
       - return df_selected (only selected categories at that level)
-      - df_other (all remaining rows)
+      - df_other (the background: all plotted rows, selected ones are drawn on top)
       - active_level
+    `df` is the full dataset and `rows` the sorted positions being plotted (None for all).
+    Selected rows come from the level's inverted index, so the cost scales
+    with the selection, not with the dataset.
     If nothing selected: return (None, None, None).
     """
     level = get_active_level(selections)
     if level is None:
         return None, None, None
 
-    selected_values = selections[level]
-    mask = df[level].isin(selected_values)
+    index = category_index(df[level], get_fingerprint(), level)
+    selected = index.positions(selections[level])
+    if rows is not None:
+        selected = restrict(selected, rows)
 
-    df_selected = df[mask].copy()
-    df_other = df[~mask].copy()
+    df_selected = df.iloc[selected]
+    df_other = df if rows is None else df.iloc[rows]
 
     return df_selected, df_other, level
 
 
-# ---------------------------------------------------------------------
-# Widgets + plotting
-# ---------------------------------------------------------------------
+def panel_layers(df, df_selected, df_other, level):
+    """Categories, colors and cells of the layers shared by all panels.
+
+    Case A (some selection): all cells in grey, selected categories colored on top.
+    Case B (no selection): color by supercluster, missing labels as black crosses.
+    Categories are coded once; each panel then only gathers its coordinates.
+    """
+    if level is not None:
+        cats = sorted(df_selected[level].dropna().unique().tolist())
+        fg, fg_col, bg = df_selected, level, df_other
+        fg_style = dict(point_size=3, alpha=0.8)
+        legend_title = f"{level} (selected)"
+    else:
+        cats = df["supercluster_name"].dropna().unique().tolist()
+        fg, fg_col, bg = df, "supercluster_name", None
+        fg_style = dict(point_size=1, alpha=0.7)
+        legend_title = "supercluster_name (no selection → default)"
+
+    palette = category_palette(len(cats))
+    codes = category_codes(fg[fg_col], cats)
+    missing = df[fg_col].isna().to_numpy() if bg is None else None
+    if missing is not None and not missing.any():
+        missing = None
+
+    handles = legend_handles(cats, palette)
+    if missing is not None:
+        handles += legend_handles(["(missing)"], ["black"], marker="x")
+
+    return dict(
+        fg=fg, codes=codes, palette=palette, bg=bg, missing=missing, fg_style=fg_style,
+        handles=handles, legend_title=legend_title,
+    )
 
-# 1) Hierarchical taxonomy widgets
-selections = taxonomy_selectors(df, key_prefix="tsne_umap_tax_")
-active_level = get_active_level(selections)
-
-st.caption(
-    f"Lowest non-empty selection level: **{active_level or 'none'}** "
-    f"(super: {len(selections['supercluster_name'])}, "
-    f"cluster: {len(selections['cluster_name'])}, "
-    f"subcluster: {len(selections['subcluster_name'])})"
-)
-
-# 2) Prepare figure
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4), sharex=False, sharey=False)
-
-# ---------- Case A: some selection exists → highlight selected vs others ----------
-df_selected, df_other, level = split_selected_other(df, selections)
-
-if level is not None:
-    # Plot "other" cells in grey background
-    if not df_other.empty:
-        ax1.scatter(df_other["umap1"], df_other["umap2"], s=1, alpha=0.2, color="lightgrey", label="_nolegend_")
-        ax2.scatter(df_other["tsna1"], df_other["tsna2"], s=1, alpha=0.2, color="lightgrey", label="_nolegend_")
-
-    # Color map for selected categories
-    cats = sorted(df_selected[level].dropna().unique().tolist())
-    cmap = plt.get_cmap("tab20")
-    colors = {cat: cmap(i % 20) for i, cat in enumerate(cats)}
-
-    for cat in cats:
-        subset = df_selected[df_selected[level] == cat]
-        ax1.scatter(
-            subset["umap1"], subset["umap2"],
-            s=3, alpha=0.8, label=str(cat),
-            color=colors[cat],
-        )
-        ax2.scatter(
-            subset["tsna1"], subset["tsna2"],
-            s=3, alpha=0.8, label=str(cat),
-            color=colors[cat],
-        )
-
-    legend_title = f"{level} (selected)"
-
-# ---------- Case B: no selection → fallback to coloring by supercluster ----------
-else:
-    taxonomy_column = "supercluster_name"
-    cats = df[taxonomy_column].dropna().unique()
-    cmap = plt.get_cmap("tab20")
-    colors = {cat: cmap(i % 20) for i, cat in enumerate(cats)}
-
-    for cat in cats:
-        subset = df[df[taxonomy_column] == cat]
-        ax1.scatter(
-            subset["umap1"], subset["umap2"],
-            s=1, alpha=0.7, label=str(cat),
-            color=colors[cat],
-        )
-        ax2.scatter(
-            subset["tsna1"], subset["tsna2"],
-            s=1, alpha=0.7, label=str(cat),
-            color=colors[cat],
-        )
-
-    # Plot NaN separately if exists
-    if df[taxonomy_column].isna().any():
-        subset_na = df[df[taxonomy_column].isna()]
-        ax1.scatter(
-            subset_na["umap1"], subset_na["umap2"],
-            s=10, alpha=0.4, marker="x", label="(missing)", color="black",
-        )
-        ax2.scatter(
-            subset_na["tsna1"], subset_na["tsna2"],
-            s=10, alpha=0.4, marker="x", label="(missing)", color="black",
-        )
-
-    legend_title = f"{taxonomy_column} (no selection → default)"
-
-# Titles and labels
-ax1.set_title("UMAP")
-ax1.set_xlabel("umap1")
-ax1.set_ylabel("umap2")
-
-ax2.set_title("tSNE")
-ax2.set_xlabel("tsna1")
-ax2.set_ylabel("tsna2")
-
-# Shared legend outside the plots
-handles, labels = ax1.get_legend_handles_labels()
-legend = fig.legend(
-    handles, labels,
-    title=legend_title,
-    loc="right",
-    bbox_to_anchor=(1.15, 0.5),
-    fontsize="small",
-)
-
-fig.tight_layout(rect=[0, 0, 0.85, 1])
-
-# Show on Streamlit
-st.pyplot(fig)
+
+def panel_job(name, df_plot, layers, renderer):
+    """The panel of embedding `name` as a picklable draw, with only the coordinates it needs."""
+    cols = [f"{name}1", f"{name}2"]
+    extent = data_extent(df_plot[cols[0]], df_plot[cols[1]]) if renderer == "raster" else None
+    bg, missing = layers["bg"], layers["missing"]
+    return partial(
+        plot_embedding_panel,
+        layers["fg"][cols].to_numpy(),
+        layers["codes"],
+        layers["palette"],
+        background=bg[cols].to_numpy() if bg is not None else None,
+        missing=df_plot[cols].to_numpy()[missing] if missing is not None else None,
+        extent=extent,
+        title=embedding_title(name),
+        labels=cols,
+        renderer=renderer,
+        **layers["fg_style"],
+    )
+
+
+def draw_legend(layers):
+    """The legend shared by all panels, as its own figure."""
+    fig = new_figure(figsize=(3, 4))
+    fig.legend(handles=layers["handles"], title=layers["legend_title"], loc="center", fontsize="small")
+    return fig
+
+
+# =======================================
+# ------------ MAIN ---------------------
+# =======================================
+# Everything runs inside main(): render worker processes import this script
+# (as __mp_main__) and must not execute the page.
+def main():
+    # Column types of the session's dataset; embeddings are every numeric <name>1/<name>2 pair
+    dtypes = get_dtypes()
+
+    st.title("Annotation view: UMAP vs TSNA")
+    st.markdown("""
+    This plot shows how our annotations lay on coordinates of UMAP (produced by our processing) and TSNA (produced by authors of the paper).
+    Other embeddings of the dataset (e.g. further `obsm` layouts of an .h5ad) can be added as panels.
+    """)
+
+    # Guard clause
+    if dtypes is None:
+        st.error("No dataset loaded. Load data on the main page first.")
+        return
+
+    embeddings = embedding_names(dtypes)
+    if not embeddings:
+        st.error("No embedding coordinates (e.g. umap1/umap2) found in data.")
+        return
+
+    shown_embeddings = st.multiselect(
+        "Embeddings",
+        options=embeddings,
+        default=[e for e in ("umap", "tsna") if e in embeddings] or embeddings[:2],
+        format_func=embedding_title,
+        key="tsne_umap_embeddings",
+    )
+    if not shown_embeddings:
+        st.warning("Select at least one embedding.")
+        return
+
+    # Get the session's dataset (taxonomy + the chosen embeddings only)
+    df = get_data(columns=[*TAXONOMY_LEVELS, *(f"{e}{i}" for e in shown_embeddings for i in (1, 2))])
+
+    # 1) Hierarchical taxonomy widgets, backed by a tree built once per dataset
+    with st.spinner("Counting cells…"):
+        tree = taxonomy_tree(count_cube(df, get_fingerprint(), tuple(TAXONOMY_LEVELS)), get_fingerprint())
+    selections = taxonomy_selectors(tree, key_prefix="tsne_umap_tax_")
+    active_level = get_active_level(selections)
+
+    st.caption(
+        f"Lowest non-empty selection level: **{active_level or 'none'}** "
+        f"(super: {len(selections['supercluster_name'])}, "
+        f"cluster: {len(selections['cluster_name'])}, "
+        f"subcluster: {len(selections['subcluster_name'])})"
+    )
+
+    renderer = st.radio(
+        "Renderer",
+        ["scatter", "raster"],
+        horizontal=True,
+        key="tsne_umap_renderer",
+        help="`raster` bins cells into a pixel grid and renders millions of cells in under a second.",
+    )
+
+    preview = st.toggle(
+        f"Preview ({PREVIEW_POINTS:,} cells, stratified by the active taxonomy level)",
+        value=True,
+        key="tsne_umap_preview",
+        help=f"Every category keeps at least {MIN_PER_CATEGORY} cells (or all of them). Switch off for the full render.",
+    )
+
+    # Preview: stratify by the column that drives the colors
+    df_plot, rows = df, None
+    if preview:
+        color_level = active_level or "supercluster_name"
+        rows = preview_rows(df[color_level], get_fingerprint(), color_level)
+        df_plot = df.iloc[rows]
+
+    # Selected vs other split (other is None when nothing is selected)
+    df_selected, df_other, level = split_selected_other(df, selections, rows)
+
+    # Every panel and the legend are rendered concurrently and cached separately,
+    # keyed by what produced them, so adding an embedding renders only that panel
+    base_key = (
+        get_fingerprint(), "tsne_umap", renderer, preview,
+        tuple(tuple(selections[lvl]) for lvl in TAXONOMY_LEVELS),
+    )
+    parts = [("legend",), *(("panel", name) for name in shown_embeddings)]
+
+    cache = figure_cache()
+    images = {part: cache.get(base_key + part) for part in parts}
+    missing = [part for part, png in images.items() if png is None]
+
+    if missing:
+        layers = panel_layers(df_plot, df_selected, df_other, level)
+        service = render_service()
+        futures = {}
+        for part in missing:
+            if part[0] == "legend":
+                futures[part] = service.submit(lambda: draw_legend(layers), dpi=150)
+            else:
+                # Agg holds the GIL while drawing markers: panels go to worker processes
+                futures[part] = service.submit(
+                    panel_job(part[1], df_plot, layers, renderer), dpi=150, processes=True
+                )
+        with st.spinner("Plotting..."):
+            for part, future in futures.items():
+                images[part] = future.result()
+                cache.put(base_key + part, images[part])
+
+    # Panels side by side (up to 3 per row), shared legend on the right of the first row
+    per_row = min(3, len(shown_embeddings))
+    for i in range(0, len(shown_embeddings), per_row):
+        row = shown_embeddings[i : i + per_row]
+        cols = st.columns([4] * per_row + [2])
+        for col, name in zip(cols, row):
+            col.image(images[("panel", name)], width="stretch")
+        if i == 0:
+            cols[-1].image(images[("legend",)], width="content")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,162 +1,147 @@
+from functools import partial
+
 import streamlit as st
-import matplotlib.pyplot as plt
-import pandas as pd
-from pandas.api.types import (
-    is_bool_dtype,
-    is_categorical_dtype,
-    is_numeric_dtype,
-)
 
-# Get dataframe from session state
-df = st.session_state.get("data")
-
-st.set_page_config(page_title="UMAP – Colored by Feature    ", layout="wide")
-st.markdown("""
-# UMAP colored by Feature
-Colors UMAP plot by various features.
-Mind that legend will not be displayed if feature has more than 41 categories.
-""")
-# Guard clause
-if df is None:
-    st.error("No dataset found in session_state under key 'data'.")
-    st.stop()
-
-# ---------------------------------------------------------------------
-# 1. Detect categorical vs numeric columns (bool → categorical)
-# ---------------------------------------------------------------------
-coord_cols = {"umap1", "umap2"}
-
-other_cols = [c for c in df.columns if c not in coord_cols]
-
-categorical_cols = []
-numeric_cols = []
-
-for col in other_cols:
-    s = df[col]
-    if is_bool_dtype(s) or is_categorical_dtype(s) or s.dtype == "object":
-        categorical_cols.append(col)
-    elif is_numeric_dtype(s):
-        numeric_cols.append(col)
-
-if not categorical_cols and not numeric_cols:
-    st.error("No non-UMAP columns found to use as color variables.")
-    st.stop()
-
-# ---------------------------------------------------------------------
-# 2. Radio: choose categorical vs numerical
-# ---------------------------------------------------------------------
-default_color_type = "categorical" if categorical_cols else "numerical"
-
-color_type = st.radio(
-    "Type of color variable",
-    ["categorical", "numerical"],
-    index=0 if default_color_type == "categorical" else 1,
-    horizontal=True,
-    key="umap_color_type",
+from dashboard.datasets import get_data, get_dtypes, get_fingerprint
+from dashboard.embedding_figures import (
+    MAX_LEGEND_CATEGORIES,
+    UMAP_COLOR_DPI,
+    color_columns,
+    plot_umap,
+    umap_color_key,
 )
-
-# Fallback if chosen type has no columns
-if color_type == "categorical" and not categorical_cols:
-    st.warning("No categorical columns detected, switching to numerical.")
-    color_type = "numerical"
-elif color_type == "numerical" and not numeric_cols:
-    st.warning("No numerical columns detected, switching to categorical.")
-    color_type = "categorical"
-
-# ---------------------------------------------------------------------
-# 3. Column selector based on radio
-# ---------------------------------------------------------------------
-if color_type == "categorical":
-    color_col = st.selectbox(
-        "Categorical column to color by",
-        options=sorted(categorical_cols),
-        key="umap_cat_color_col",
-    )
-else:
-    color_col = st.selectbox(
-        "Numerical column to color by",
-        options=sorted(numeric_cols),
-        key="umap_num_color_col",
+from dashboard.lru import figure_cache
+from dashboard.sampling import MIN_PER_CATEGORY, PREVIEW_POINTS, preview_rows
+from dashboard.spatial import embedding_index
+from dashboard.render import render_service
+
+
+def render_png(color_col, color_type, renderer, preview, view=None, index=None, max_points=None):
+    # Data is selected here, in the script thread; only drawing runs on the render pool
+    df = get_data(columns=["umap1", "umap2", color_col])
+    if view is not None:
+        # Only the cells in view (density-capped) are touched
+        df = df.iloc[index.query(*view, max_points=max_points)]
+    elif preview:
+        df = df.iloc[preview_rows(df[color_col], get_fingerprint(), color_col)]
+    draw = partial(plot_umap, df, color_col, color_type, renderer, view)
+    return render_service().render(draw, dpi=UMAP_COLOR_DPI, processes=True)
+
+
+# =======================================
+# ------------ MAIN ---------------------
+# =======================================
+def main():
+    st.set_page_config(page_title="UMAP – Colored by Feature    ", layout="wide")
+    st.markdown(f"""
+    # UMAP colored by Feature
+    Colors UMAP plot by various features.
+    Mind that legend will not be displayed if feature has more than {MAX_LEGEND_CATEGORIES} categories.
+    """)
+
+    # Column types of the session's dataset; data is read once a column is chosen
+    dtypes = get_dtypes()
+
+    # Guard clause
+    if dtypes is None:
+        st.error("No dataset loaded. Load data on the main page first.")
+        return
+
+    # ---------------------------------------------------------------------
+    # 1. Detect categorical vs numeric columns (bool → categorical)
+    # ---------------------------------------------------------------------
+    categorical_cols, numeric_cols = color_columns(dtypes)
+
+    if not categorical_cols and not numeric_cols:
+        st.error("No non-UMAP columns found to use as color variables.")
+        return
+
+    # ---------------------------------------------------------------------
+    # 2. Radio: choose categorical vs numerical
+    # ---------------------------------------------------------------------
+    default_color_type = "categorical" if categorical_cols else "numerical"
+
+    color_type = st.radio(
+        "Type of color variable",
+        ["categorical", "numerical"],
+        index=0 if default_color_type == "categorical" else 1,
+        horizontal=True,
+        key="umap_color_type",
     )
 
-# ---------------------------------------------------------------------
-# 4. Plotting: discrete legend (categorical) vs colorbar (numeric)
-# ---------------------------------------------------------------------
-with st.spinner("Plotting..."):
-    fig, ax = plt.subplots()
-
-    fig, ax = plt.subplots(figsize=(6, 5))
-
+    # Fallback if chosen type has no columns
+    if color_type == "categorical" and not categorical_cols:
+        st.warning("No categorical columns detected, switching to numerical.")
+        color_type = "numerical"
+    elif color_type == "numerical" and not numeric_cols:
+        st.warning("No numerical columns detected, switching to categorical.")
+        color_type = "categorical"
+
+    # ---------------------------------------------------------------------
+    # 3. Column selector based on radio
+    # ---------------------------------------------------------------------
     if color_type == "categorical":
-        # --- overlay style: grey background + colored categories ---
-        ax.scatter(
-            df["umap1"], df["umap2"],
-            s=1, alpha=0.15, color="lightgrey", label="_background_"
+        color_col = st.selectbox(
+            "Categorical column to color by",
+            options=sorted(categorical_cols),
+            key="umap_cat_color_col",
         )
-
-        cats = sorted(
-            df[color_col].dropna().unique().tolist(),
-            key=lambda x: str(x)
+    else:
+        color_col = st.selectbox(
+            "Numerical column to color by",
+            options=sorted(numeric_cols),
+            key="umap_num_color_col",
         )
-        cmap = plt.get_cmap("tab20")
-        colors = {cat: cmap(i % 20) for i, cat in enumerate(cats)}
-
-        # Draw overlay
-        for cat in cats:
-            subset = df[df[color_col] == cat]
-            if subset.empty:
-                continue
-            ax.scatter(
-                subset["umap1"], subset["umap2"],
-                s=1, alpha=0.8,
-                label=str(cat),
-                color=colors[cat],
+
+    renderer = st.radio(
+        "Renderer",
+        ["scatter", "raster"],
+        horizontal=True,
+        key="umap_color_renderer",
+        help="`raster` bins cells into a pixel grid and renders millions of cells in under a second.",
+    )
+
+    preview = st.toggle(
+        f"Preview ({PREVIEW_POINTS:,} cells, stratified by the color column)",
+        value=True,
+        key="umap_color_preview",
+        help=f"Every category keeps at least {MIN_PER_CATEGORY} cells (or all of them). Switch off for the full render.",
+    )
+
+    # ---------------------------------------------------------------------
+    # Zoom: viewport queries on a grid index over the UMAP coordinates
+    # ---------------------------------------------------------------------
+    view, max_points, index = None, None, None
+
+    with st.expander("Zoom"):
+        if st.checkbox("Zoom into a region", key="umap_color_zoom"):
+            coords = get_data(columns=["umap1", "umap2"])
+            index = embedding_index(
+                coords["umap1"].to_numpy(), coords["umap2"].to_numpy(),
+                get_fingerprint(), "umap1", "umap2",
+            )
+            x0, x1, y0, y1 = (float(v) for v in index.extent)
+            x_range = st.slider("umap1 range", x0, x1, (x0, x1), key="umap_color_zoom_x")
+            y_range = st.slider("umap2 range", y0, y1, (y0, y1), key="umap_color_zoom_y")
+            max_points = st.slider(
+                "Max cells drawn in view",
+                min_value=10_000, max_value=1_000_000, value=200_000, step=10_000,
+                key="umap_color_zoom_max_points",
+                help="Dense regions are thinned first; sparse regions keep all their cells.",
             )
+            view = (*x_range, *y_range)
 
-        # # Missing values shown separately
-        # if df[color_col].isna().any():
-        #     subset_na = df[df[color_col].isna()]
-        #     ax.scatter(
-        #         subset_na["umap1"], subset_na["umap2"],
-        #         s=3, alpha=0.4, marker="x",
-        #         label="(missing)", color="black",
-        #     )
-
-        # ---------- NEW FEATURE: disable legend if too many categories ----------
-        max_legend_categories = 41
-
-        if len(cats) <= max_legend_categories:
-            handles, labels = ax.get_legend_handles_labels()
-            if handles:
-                fig.legend(
-                    handles, labels,
-                    title=f"{color_col}",
-                    loc="right",
-                    bbox_to_anchor=(1.18, 0.5),
-                    fontsize="small",
-                )
-            fig.tight_layout(rect=[0, 0, 0.82, 1])
-        else:
-            # No legend → normal tight layout
-            fig.tight_layout()
+    # Rendered images are shared across reruns and sessions, keyed by what produced them
+    preview = preview and view is None  # zooming has its own cell budget
+    cache_key = umap_color_key(get_fingerprint(), color_col, color_type, renderer, preview, view, max_points)
 
-    else:
-        # numerical → continuous colormap + colorbar
-        values = df[color_col].astype(float)
-        sc = ax.scatter(
-            df["umap1"],
-            df["umap2"],
-            s=1,
-            alpha=0.8,
-            c=values,
-            cmap="viridis",
+    with st.spinner("Plotting..."):
+        png = figure_cache().get_or_render(
+            cache_key, lambda: render_png(color_col, color_type, renderer, preview, view, index, max_points)
         )
-        cbar = fig.colorbar(sc, ax=ax)
-        cbar.set_label(color_col)
-        fig.tight_layout()
 
-    ax.set_xlabel("umap1")
-    ax.set_ylabel("umap2")
-    ax.set_title(f"UMAP colored by {color_col} ({color_type})")
+    st.image(png, width="stretch")
+
 
-    st.pyplot(fig)
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,177 @@
 # pages/03_UMAP_by_sample.py
 
-import io
+from functools import partial
 
-import matplotlib.pyplot as plt
-import seaborn as sns
+import numpy as np
 import streamlit as st
 import pandas as pd
 
-@st.cache_data
-def plot_umap_by_sample_seaborn(
-    df,
-    x_col="umap1",
-    y_col="umap2",
-    sample_col="sample",
-    alpha=0.6,
-    point_size=3,
-    seed=0,
-    palette="tab20",  # Seaborn will cycle automatically even if >20 categories
-):
-    """
-    Plot all samples on one UMAP figure, layered randomly,
-    using Seaborn for categorical coloring.
+from dashboard.artifacts import artifact_cache
+from dashboard.datasets import get_data, get_fingerprint
+from dashboard.embedding_figures import (
+    TILE_SIZE,
+    UMAP_SAMPLES_DPI,
+    plot_sample_tile,
+    umap_samples_draw,
+    umap_samples_key,
+)
+from dashboard.jobs import job_scheduler
+from dashboard.lru import figure_cache
+from dashboard.plotting import category_palette
+from dashboard.raster import aggregate, data_extent, shade_counts
+from dashboard.render import render_service
+from dashboard.rowindex import category_index
+
+# Columns this page reads from the dataset
+COLUMNS = ["umap1", "umap2", "sample"]
+
+# Export formats: label → (matplotlib format, MIME type)
+EXPORT_FORMATS = {
+    "PNG": ("png", "image/png"),
+    "SVG (points rasterized)": ("svg", "image/svg+xml"),
+    "PDF (points rasterized)": ("pdf", "application/pdf"),
+}
+EXPORT_DPI = 400
+
+# Small multiples: grey background cells of scatter tiles
+TILE_BACKGROUND_POINTS = 50_000
+
+def sample_grid(df, renderer, seed):
+    """One tile per sample, rendered in the render worker processes and cached per (dataset, sample, seed)."""
+    samples = pd.Categorical(df["sample"])
+    all_samples = samples.categories.tolist()
+    colors = category_palette(len(all_samples), "tab20")  # same colors as the overlay
+
+    col_pick, col_order, col_ncols = st.columns([4, 2, 1])
+    shown = col_pick.multiselect(
+        "Samples", options=all_samples, default=all_samples, key="umap_samples_grid_samples",
+    )
+    order = col_order.radio(
+        "Order", ["name", "cell count"], horizontal=True, key="umap_samples_grid_order",
+    )
+    n_cols = col_ncols.number_input("Columns", min_value=2, max_value=8, value=5, key="umap_samples_grid_cols")
+
+    if not shown:
+        st.info("Select at least one sample.")
+        return
+
+    index = category_index(df["sample"], get_fingerprint(), "sample")
+    if order == "cell count":
+        shown = sorted(shown, key=lambda s: index.count([s]), reverse=True)
+
+    # Tiles are keyed by sample, not by position: re-ordering or adding samples
+    # only renders the tiles that are not cached yet
+    fingerprint = get_fingerprint()
+    keys = {
+        s: (fingerprint, "umap_samples_tile", renderer, s, int(seed) if renderer == "scatter" else None)
+        for s in shown
+    }
+    cache = figure_cache()
+    tiles = {s: cache.get(k) for s, k in keys.items()}
+    missing = [s for s, png in tiles.items() if png is None]
+
+    if missing:
+        x = df["umap1"].to_numpy()
+        y = df["umap2"].to_numpy()
+        extent = data_extent(x, y)  # shared by all tiles
+        if renderer == "raster":
+            background = shade_counts(aggregate(x, y, extent, size=TILE_SIZE), max_alpha=0.4)
+        else:
+            rng = np.random.default_rng(seed)
+            bg_rows = np.sort(rng.choice(len(x), min(len(x), TILE_BACKGROUND_POINTS), replace=False))
+            background = (x[bg_rows], y[bg_rows])
+
+        # Each tile gets only its sample's cells and goes to a worker process
+        # (Agg holds the GIL while drawing markers)
+        service = render_service()
+        futures = {}
+        for s in missing:
+            rows = index.positions([s])
+            tile = partial(
+                plot_sample_tile, x[rows], y[rows], background, extent,
+                colors[all_samples.index(s)], f"{s} ({len(rows):,})", renderer,
+            )
+            futures[s] = service.submit(tile, dpi=100, processes=True)
+        with st.spinner(f"Rendering {len(missing)} tiles..."):
+            for s, future in futures.items():
+                tiles[s] = future.result()
+                cache.put(keys[s], tiles[s])
+
+    for i in range(0, len(shown), n_cols):
+        cols = st.columns(n_cols)
+        for col, s in zip(cols, shown[i : i + n_cols]):
+            col.image(tiles[s], width="stretch")
+
+
+def export_params(renderer, seed, fmt):
+    """What an export depends on (besides the dataset); the seed only matters for scatter."""
+    return {
+        "renderer": renderer,
+        "seed": int(seed) if renderer == "scatter" else None,
+        "format": fmt,
+        "dpi": EXPORT_DPI,
+    }
+
+
+@st.fragment(run_every=1)
+def export_progress(job_key):
+    """Poll a running export; rerun the page once it has finished."""
+    job = job_scheduler().get(job_key)
+    if job is None or job.status in ("done", "failed"):
+        st.rerun()
+    st.info(f"Rendering {job.label} in the background ({job.elapsed:.0f} s)…")
+
+
+def export_section(df, renderer, seed):
+    """Download at EXPORT_DPI, rendered only on request, in the background, cached on disk.
+
+    Exports are cached per (dataset, renderer, seed, format), so each one is
+    rendered at most once, whichever session asks for it.
     """
+    st.markdown("**Export**")
+    label = st.selectbox("Format", options=list(EXPORT_FORMATS), key="umap_samples_export_format")
+    fmt, mime = EXPORT_FORMATS[label]
+
+    fingerprint = get_fingerprint()
+    params = export_params(renderer, seed, fmt)
+
+    scheduler = job_scheduler()
+    job_key = (fingerprint, "export:umap_by_sample", *params.values())
+    job = scheduler.get(job_key)
+
+    data = artifact_cache.get(artifact_cache.key(fingerprint.digest, "umap_by_sample", params))
+    if data is None and job is not None:
+        # Rendered, but the artifact cache could not keep it (disk full, read-only, size cap)
+        data = job.result
+    if data is not None:
+        st.download_button(
+            label=f"Download UMAP as {fmt.upper()}",
+            data=data,
+            file_name=f"umap_by_sample.{fmt}",
+            mime=mime,
+        )
+        return
 
-    # Shuffle rows to randomize layering
-    df_shuffled = df.sample(frac=1.0, random_state=seed)
-
-    # Build the static figure
-    plt.figure(figsize=(7, 7))
-
-    # NOTE: Seaborn scatterplot must be drawn on a single axes
-    ax = sns.scatterplot(
-        data=df_shuffled,
-        x=x_col,
-        y=y_col,
-        hue=sample_col,
-        palette=palette,
-        s=point_size,
-        alpha=alpha,
-        edgecolor=None,
-        linewidth=0,
-    )
+    if job is not None and job.status in ("queued", "running"):
+        export_progress(job_key)
+        return
+    if job is not None and job.status == "failed":
+        st.error(f"Export failed: {job.error}")
 
-    ax.set_title("UMAP by sample (random shuffling) (color = sample)")
-    ax.set_xlabel("UMAP1")
-    ax.set_ylabel("UMAP2")
+    if st.button(f"Prepare {fmt.upper()} export ({EXPORT_DPI} dpi)", key="umap_samples_export"):
+        # Millions of vector markers would make SVG/PDF unusable: embed the points as an image
+        draw = umap_samples_draw(df, renderer, seed, rasterized=fmt != "png")
+        service = render_service()
 
-    # legend removed (41 samples is huge)
-    ax.get_legend().remove()
+        def export():
+            # Cached on disk for all sessions; the job keeps the bytes too, in case the write failed
+            return artifact_cache.get_or_compute(
+                fingerprint.digest, "umap_by_sample", params,
+                lambda: service.render(draw, format=fmt, dpi=EXPORT_DPI, processes=True),
+            )
 
-    plt.tight_layout()
-    return ax.get_figure(), ax
+        scheduler.submit(job_key, f"UMAP by sample export ({label})", export, rerun=True)
+        st.rerun()
 
 
 # --- Streamlit page ---
@@ -61,44 +182,54 @@ def main():
         The plot should look like white noise - samples should not correlate with UMAP coordinates.
         
         The dataset is shuffled to randomise plotting. You may test different shuffling instances by sliding widget of `seed` bellow.""")
-    # Get dataframe from session state
-    df = st.session_state.get("data")
+    # Get the session's dataset
+    df = get_data(columns=COLUMNS)
 
 
     # Guard clause
     if df is None:
-        st.error("No dataset found in session_state under key 'data'.")
+        st.error("No dataset loaded. Load data on the main page first.")
         st.stop()
 
     if df.empty:
         st.warning("Replace `load_data()` with your own loader so that `df` has columns: umap1, umap2, sample.")
         return
 
+    renderer = st.radio(
+        "Renderer",
+        ["scatter", "raster"],
+        horizontal=True,
+        key="umap_samples_renderer",
+        help="`raster` bins cells into a pixel grid and blends overlapping samples; the seed has no effect.",
+    )
+
     seed = st.number_input("Random seed (layering order)", min_value=0, value=0, step=1)
 
-    # Build figure
-    fig, ax = plot_umap_by_sample_seaborn(
-        df=df,
-        x_col="umap1",
-        y_col="umap2",
-        seed=seed,
+    view = st.radio(
+        "View",
+        ["overlay", "grid"],
+        horizontal=True,
+        key="umap_samples_view",
+        help="`grid` draws one tile per sample, highlighted against all cells in grey.",
     )
+    if view == "grid":
+        sample_grid(df, renderer, seed)
+        return
 
-    st.pyplot(fig, clear_figure=False)
+    # Build figure: drawn in a render worker, encoded images shared across reruns and sessions
+    draw = umap_samples_draw(df, renderer, seed)
+    cache_key = umap_samples_key(get_fingerprint(), renderer, seed)
 
-    # --- Download button ---
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=400, bbox_inches="tight")
-    buf.seek(0)
+    with st.spinner("Plotting..."):
+        png = figure_cache().get_or_render(
+            cache_key, lambda: render_service().render(draw, dpi=UMAP_SAMPLES_DPI, processes=True)
+        )
 
-    st.download_button(
-        label="Download UMAP as PNG",
-        data=buf,
-        file_name="umap_by_sample.png",
-        mime="image/png",
-    )
+    st.image(png, width="stretch")
 
+    # --- Export (rendered on request only) ---
+    export_section(df, renderer, seed)
 
-if __name__ == "__main__":
 
+if __name__ == "__main__":
     main()